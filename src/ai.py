@@ -0,0 +1,245 @@
+import heapq
+import math
+
+from src.base import Direction, Tank, destroyable_flags, strengths
+from src.config import GameConfig
+
+half_size = GameConfig.cube_size // 2
+inf = float('inf')
+shoot_cost = 5
+steps = {
+    Direction.UP: (-1, 0),
+    Direction.DOWN: (1, 0),
+    Direction.LEFT: (0, -1),
+    Direction.RIGHT: (0, 1),
+}
+
+
+def stride_for(speed: int):
+    return math.lcm(speed, half_size) // half_size
+
+
+def breakable_kinds(power: int):
+    return frozenset(k for k, destroyable in enumerate(destroyable_flags) if destroyable and power >= strengths[k])
+
+
+class FlowField(object):
+    def __init__(self, grid, goal, stride=1, breakable=frozenset()):
+        self.grid = grid
+        self.stride = stride
+        self.breakable = breakable
+        self.rows = (grid.rows - 2) // stride + 1
+        self.columns = (grid.columns - 2) // stride + 1
+        self.goal = goal
+        self.cost = [self.node_cost(i, j) for i in range(self.rows) for j in range(self.columns)]
+        self.dist = [inf] * (self.rows * self.columns)
+        self.build()
+
+    def node_cost(self, i: int, j: int):
+        cost = 1
+        row, column = i * self.stride, j * self.stride
+        for r in (row, row + 1):
+            for c in (column, column + 1):
+                k = r * self.grid.columns + c
+                if self.grid.tank_blocked[k]:
+                    if self.grid.kinds[k] not in self.breakable:
+                        return inf
+                    cost = shoot_cost
+        return cost
+
+    def is_goal(self, i: int, j: int):
+        first_row, last_row, first_column, last_column = self.goal
+        row, column = i * self.stride, j * self.stride
+        return row + 1 >= first_row and row <= last_row and column + 1 >= first_column and column <= last_column
+
+    def neighbours(self, n: int):
+        i, j = divmod(n, self.columns)
+        if i > 0:
+            yield n - self.columns
+        if i < self.rows - 1:
+            yield n + self.columns
+        if j > 0:
+            yield n - 1
+        if j < self.columns - 1:
+            yield n + 1
+
+    def build(self):
+        heap = []
+        for i in range(self.rows):
+            for j in range(self.columns):
+                if self.is_goal(i, j):
+                    n = i * self.columns + j
+                    self.dist[n] = 0
+                    heap.append((0, n))
+        heapq.heapify(heap)
+        self.propagate(heap)
+
+    def propagate(self, heap):
+        dist, cost = self.dist, self.cost
+        while heap:
+            d, n = heapq.heappop(heap)
+            if d > dist[n] or cost[n] == inf:
+                continue
+            nd = d + cost[n]
+            for m in self.neighbours(n):
+                if nd < dist[m]:
+                    dist[m] = nd
+                    heapq.heappush(heap, (nd, m))
+
+    def update(self, row: int, column: int):
+        heap = []
+        for i in range(max(row - 1, 0) // self.stride, row // self.stride + 1):
+            for j in range(max(column - 1, 0) // self.stride, column // self.stride + 1):
+                if i >= self.rows or j >= self.columns:
+                    continue
+                n = i * self.columns + j
+                cost = self.node_cost(i, j)
+                if cost < self.cost[n]:
+                    self.cost[n] = cost
+                    heap.append((self.dist[n], n))
+        heapq.heapify(heap)
+        self.propagate(heap)
+
+    def node(self, tank: Tank):
+        size = half_size * self.stride
+        if tank.x % size != 0 or tank.y % size != 0:
+            return None
+        i, j = int(tank.y // size), int(tank.x // size)
+        if i >= self.rows or j >= self.columns:
+            return None
+        return i * self.columns + j
+
+    def ahead(self, n: int, direction: Direction):
+        di, dj = steps[direction]
+        i, j = divmod(n, self.columns)
+        i, j = i + di, j + dj
+        if 0 <= i < self.rows and 0 <= j < self.columns:
+            return i * self.columns + j
+        return None
+
+    def direction(self, n: int):
+        best, best_direction = inf, None
+        for direction in steps:
+            m = self.ahead(n, direction)
+            if m is not None and self.cost[m] != inf and self.dist[m] + self.cost[m] < best:
+                best, best_direction = self.dist[m] + self.cost[m], direction
+        return best_direction
+
+
+class EnemyAI(object):
+    def __init__(self, world):
+        self.world = world
+        self.fields = {}
+        self.tank_fields = {}
+        self.last = {}
+        self.wander = {}
+        self.goal = self.base_goal()
+
+    def base_goal(self):
+        area = GameConfig.brink_area(self.world.columns, self.world.rows)
+        rows = [i for i, _ in area]
+        columns = [j for _, j in area]
+        return min(rows) * 2 - 1, max(rows) * 2 + 2, min(columns) * 2 - 1, max(columns) * 2 + 2
+
+    def field(self, tank: Tank):
+        field = self.tank_fields.get(tank)
+        if field is None:
+            key = (stride_for(tank.speed), breakable_kinds(tank.power))
+            field = self.fields.get(key)
+            if field is None:
+                field = FlowField(self.world.grid, self.goal, *key)
+                self.fields[key] = field
+            self.tank_fields[tank] = field
+        return field
+
+    def forget(self, tank: Tank):
+        self.tank_fields.pop(tank, None)
+        self.last.pop(tank, None)
+        self.wander.pop(tank, None)
+
+    def terrain_changed(self, row: int, column: int):
+        for field in self.fields.values():
+            field.update(row, column)
+
+    def steer(self, tank: Tank):
+        if self.wander.get(tank, 0) > 0:
+            self.wander[tank] -= 1
+            return
+        field = self.field(tank)
+        n = field.node(tank)
+        if n is None:
+            return
+        if field.dist[n] == 0:
+            tank.directions = []
+            tank.direction = self.face_base(tank)
+            return
+        direction = field.direction(n)
+        if direction is not None:
+            tank.directions = [direction]
+
+    def face_base(self, tank: Tank):
+        first_row, last_row, first_column, last_column = self.goal
+        dy = (first_row + last_row + 1) / 2 * half_size - (tank.y + half_size)
+        dx = (first_column + last_column + 1) / 2 * half_size - (tank.x + half_size)
+        if abs(dx) > abs(dy):
+            return Direction.RIGHT if dx > 0 else Direction.LEFT
+        return Direction.DOWN if dy > 0 else Direction.UP
+
+    def think(self, tick: int):
+        enemies = self.world.enemies
+        period = self.world.ai_ticks
+        first = -(tick + 1) % period
+        bucket = enemies[first::period]
+        if not bucket:
+            return
+        full_round = (tick + 1 + first) // period % GameConfig.far_ai_factor == 0
+        players = self.world.players
+        focus_width, focus_height = self.world.focus_width, self.world.focus_height
+        for tank in bucket:
+            near = not players
+            target = None
+            for player in players:
+                dx, dy = player.x - tank.x, player.y - tank.y
+                if abs(dx) <= focus_width and abs(dy) <= focus_height:
+                    near = True
+                    if abs(dx) < half_size or abs(dy) < half_size:
+                        target = self.aim(tank, player, dx, dy)
+                        if target is not None:
+                            break
+            if target is not None:
+                tank.direction = target
+                tank.directions = [target]
+                self.world.shoot(tank)
+                self.last[tank] = (tank.x, tank.y)
+            elif near or full_round:
+                self.decide(tank)
+
+    def aim(self, tank: Tank, player: Tank, dx: float, dy: float):
+        if abs(dx) < half_size:
+            direction = Direction.DOWN if dy > 0 else Direction.UP
+        else:
+            direction = Direction.RIGHT if dx > 0 else Direction.LEFT
+        if self.world.can_hit(tank, player, direction, self.field(tank).breakable):
+            return direction
+        return None
+
+    def decide(self, tank: Tank):
+        rng = self.world.rng
+        field = self.field(tank)
+        n = field.node(tank)
+        blocked = False
+        if n is not None:
+            if field.dist[n] == 0:
+                self.world.shoot(tank)
+                return
+            m = field.ahead(n, tank.direction)
+            blocked = m is not None and field.cost[m] == shoot_cost
+        position = (tank.x, tank.y)
+        if blocked:
+            self.world.shoot(tank)
+        elif self.last.get(tank) == position and tank.directions:
+            tank.directions = [rng.choice(list(steps))]
+            self.wander[tank] = self.world.ai_ticks
+        elif rng.randint(0, 99) < 10:
+            self.world.shoot(tank)
+        self.last[tank] = position
@@ -3,23 +3,36 @@ import random
 from src.config import GameConfig
 
 
-def generate_random_map(columns: int, rows: int):
-    terrain_map = []
-    terrains = list(TerrainType.__members__.values())
-    weights = GameConfig.terrain_weights()
-    for i in range(rows):
-        terrain_type_line = random.choices(terrains, weights=weights, k=columns)
-        terrain_line = [Terrain(t) for t in terrain_type_line]
-        terrain_map.append(terrain_line)
-    for (i, j) in GameConfig.blank_area():
-        terrain_map[i][j] = Terrain(TerrainType.BLANK, [1, 1, 1, 1])
-    for (i, j) in GameConfig.steel_area():
-        terrain_map[i][j] = Terrain(TerrainType.STEEL, [1, 1, 1, 1])
-    for (i, j) in GameConfig.brink_area():
-        terrain_map[i][j] = Terrain(TerrainType.BRINK, [1, 1, 1, 1])
+def generate_map(columns: int, rows: int, seed=None):
+    rng = random.Random(seed)
+    indices = [t.index for t in TerrainType]
+    types = rng.choices(indices, weights=GameConfig.terrain_weights(), k=columns * rows)
+    states = rng.choices(range(1, 16), k=columns * rows)
+    blank = TerrainType.BLANK.index
+    cells = bytearray(t << 4 | (15 if t == blank else state) for t, state in zip(types, states))
+    terrain_map = TerrainMap(columns, rows, cells, seed)
+    for area, terrain in ((GameConfig.blank_area(columns, rows), TerrainType.BLANK),
+                          (GameConfig.steel_area(columns, rows), TerrainType.STEEL),
+                          (GameConfig.brink_area(columns, rows), TerrainType.BRINK)):
+        for (i, j) in area:
+            if 0 <= i < rows and 0 <= j < columns:
+                terrain_map.set(i, j, terrain, 15)
     return terrain_map
 
 
+def map_seeds(seed, count: int):
+    rng = random.Random(seed)
+    return [rng.getrandbits(32) for _ in range(count)]
+
+
+def generate_maps(columns: int, rows: int, count: int, seed=None):
+    return [generate_map(columns, rows, s) for s in map_seeds(seed, count)]
+
+
+def generate_random_map(columns: int, rows: int, seed=None):
+    return generate_map(columns, rows, seed).terrain_list()
+
+
 class Direction(Enum):
     UP = 0
     LEFT = 1
@@ -28,18 +41,20 @@ class Direction(Enum):
 
 
 class TerrainType(Enum):
-    BLANK = 1, True, True, False, 0
-    BRINK = 2, False, False, True, 0
-    STEEL = 3, False, False, True, 20
-    GRASS = 4, True, True, False, 0
-    WATER = 5, False, True, False, 0
+    BLANK = 1, True, True, False, 0, None
+    BRINK = 2, False, False, True, 0, 'brink.png'
+    STEEL = 3, False, False, True, 20, 'steel.png'
+    GRASS = 4, True, True, False, 0, 'grass.png'
+    WATER = 5, False, True, False, 0, 'water.png'
 
-    def __init__(self, index: int, tank_passable: bool, ammo_passable: bool, destroyable: bool, strength: int):
+    def __init__(self, index: int, tank_passable: bool, ammo_passable: bool, destroyable: bool, strength: int,
+                 pic: str):
         self._index = index
         self._tank_passable = tank_passable
         self._ammo_passable = ammo_passable
         self._destroyable = destroyable
         self._strength = strength
+        self._pic = pic
 
     @property
     def index(self):
@@ -61,6 +76,24 @@ class TerrainType(Enum):
     def strength(self):
         return self._strength
 
+    @property
+    def pic(self):
+        return self._pic
+
+
+def terrain_table(value):
+    table = [None] * (max(t.index for t in TerrainType) + 1)
+    for t in TerrainType:
+        table[t.index] = value(t)
+    return tuple(table)
+
+
+terrain_types = terrain_table(lambda t: t)
+tank_passable_flags = terrain_table(lambda t: t.tank_passable)
+ammo_passable_flags = terrain_table(lambda t: t.ammo_passable)
+destroyable_flags = terrain_table(lambda t: t.destroyable)
+strengths = terrain_table(lambda t: t.strength)
+
 
 class TankType(Enum):
     PLAYER_ONE = 'Player 1', 3, 20, 10, 3, 3, 10, True, 'player_tank_1.png'
@@ -119,7 +152,11 @@ class TankType(Enum):
 
 
 class Tank(object):
-    def __init__(self, tank):
+    __slots__ = ('tank_type', 'name', 'lives', 'hit_point', 'power', 'max_storage', 'speed', 'ammo_speed',
+                 'is_player', 'pic', 'ammo_storage', 'x', 'y', 'direction', 'directions')
+
+    def __init__(self, tank, direction=Direction.UP):
+        self.tank_type = tank
         self.name = tank.name
         self.lives = tank.lives
         self.hit_point = tank.hit_point
@@ -130,9 +167,130 @@ class Tank(object):
         self.is_player = tank.is_player
         self.pic = tank.pic
         self.ammo_storage = self.max_storage
+        self.x = 0
+        self.y = 0
+        self.direction = direction
+        self.directions = []
+
+    def rect(self):
+        return self.x, self.y, GameConfig.cube_size, GameConfig.cube_size
+
+
+class Ammo(object):
+    __slots__ = ('tank', 'direction', 'available', 'x', 'y')
+    width = 5
+    length = 8
+
+    def __init__(self, tank=None, direction=Direction.UP):
+        self.tank = tank
+        self.direction = direction
+        self.available = False
+        self.x = 0
+        self.y = 0
+        if tank is not None:
+            self.reset(tank, direction)
+
+    def reset(self, tank: Tank, direction: Direction):
+        self.tank = tank
+        self.direction = direction
+        self.available = True
+        half = GameConfig.cube_size / 2
+        if direction == Direction.UP:
+            self.x = tank.x + half - 3
+            self.y = tank.y
+        elif direction == Direction.DOWN:
+            self.x = tank.x + half + 3
+            self.y = tank.y + GameConfig.cube_size
+        elif direction == Direction.LEFT:
+            self.x = tank.x
+            self.y = tank.y + half + 3
+        else:
+            self.x = tank.x + GameConfig.cube_size
+            self.y = tank.y + half - 3
+
+    def rect(self):
+        if self.direction == Direction.UP:
+            return self.x, self.y, self.width, self.length
+        elif self.direction == Direction.DOWN:
+            return self.x - self.width, self.y - self.length, self.width, self.length
+        elif self.direction == Direction.LEFT:
+            return self.x, self.y - self.width, self.length, self.width
+        else:
+            return self.x - self.length, self.y, self.length, self.width
+
+
+class AmmoPool(object):
+    def __init__(self):
+        self.capacity = 0
+        self.live = 0
+        self.free = []
+
+    def reserve(self, count: int):
+        self.capacity += count
+        self.free.extend(Ammo() for _ in range(count))
+
+    def acquire(self, tank: Tank, direction: Direction):
+        ammo = self.free.pop() if self.free else Ammo()
+        ammo.reset(tank, direction)
+        self.live += 1
+        return ammo
+
+    def release(self, ammo: Ammo):
+        ammo.available = False
+        ammo.tank = None
+        self.live -= 1
+        if len(self.free) + self.live < self.capacity:
+            self.free.append(ammo)
+
+    def stats(self):
+        return {'live': self.live, 'pooled': len(self.free), 'capacity': self.capacity}
+
+
+class TerrainMap(object):
+    __slots__ = ('columns', 'rows', 'cells', 'seed')
+
+    def __init__(self, columns: int, rows: int, cells=None, seed=None):
+        self.columns = columns
+        self.rows = rows
+        self.seed = seed
+        if cells is None:
+            cells = bytearray([TerrainType.BLANK.index << 4 | 15]) * (columns * rows)
+        self.cells = cells
+
+    def get(self, i: int, j: int):
+        cell = self.cells[i * self.columns + j]
+        return terrain_types[cell >> 4], cell & 15
+
+    def terrain(self, i: int, j: int):
+        return terrain_types[self.cells[i * self.columns + j] >> 4]
+
+    def set(self, i: int, j: int, terrain: TerrainType, state: int):
+        self.cells[i * self.columns + j] = terrain.index << 4 | state
+
+    def clear(self, i: int, j: int, index: int):
+        self.cells[i * self.columns + j] &= ~(1 << index) & 0xff
+
+    def copy(self):
+        return TerrainMap(self.columns, self.rows, bytearray(self.cells), self.seed)
+
+    def terrain_list(self):
+        terrain_map = []
+        for i in range(self.rows):
+            line = []
+            for j in range(self.columns):
+                terrain, state = self.get(i, j)
+                line.append(Terrain(terrain, [state >> b & 1 for b in range(4)]))
+            terrain_map.append(line)
+        return terrain_map
+
+    def __eq__(self, other):
+        return (isinstance(other, TerrainMap) and (self.columns, self.rows) == (other.columns, other.rows)
+                and self.cells == other.cells)
 
 
 class Terrain(object):
+    __slots__ = ('terrain', 'state')
+
     def __init__(self, terrain: TerrainType, state=None):
         self.terrain = terrain
         if state is None and terrain != TerrainType.BLANK:
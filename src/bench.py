@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from src.base import generate_map
+from src.config import GameConfig
+from src.world import World
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples):
+    return {
+        'p50': percentile(samples, 50),
+        'p99': percentile(samples, 99),
+        'mean': sum(samples) / len(samples),
+        'max': max(samples),
+    }
+
+
+def feed(world: World, bullets: int):
+    for tank in world.tanks():
+        if len(world.ammos) >= bullets:
+            return
+        world.shoot(tank)
+
+
+def measure(step, ticks: int):
+    times = []
+    growth = []
+    for _ in range(ticks):
+        allocated = sys.getallocatedblocks()
+        start = time.perf_counter()
+        step()
+        times.append((time.perf_counter() - start) * 1000)
+        growth.append(sys.getallocatedblocks() - allocated)
+    return {'tick_ms': summarize(times), 'block_growth': summarize(growth)}
+
+
+def bench_mapgen(args):
+    seeds = iter(range(args.seed, args.seed + args.ticks))
+    return measure(lambda: generate_map(GameConfig.columns, GameConfig.rows, next(seeds)), args.ticks)
+
+
+def bench_collision(args):
+    world = World(seed=args.seed)
+    world.populate(1, args.enemies)
+    rng = random.Random(args.seed)
+    size = GameConfig.cube_size
+    rects = [(rng.uniform(0, world.width - size), rng.uniform(0, world.height - size), size, size)
+             for _ in range(256)]
+
+    def step():
+        for rect in rects:
+            world.grid.tank_blocked_in(rect)
+            world.grid.hits(rect)
+            world.tank_hash.query(rect)
+
+    result = measure(step, args.ticks)
+    result['queries_per_tick'] = len(rects) * 3
+    return result
+
+
+def bench_world(args):
+    world = World(seed=args.seed)
+    world.populate(1, args.enemies)
+    live = []
+
+    def step():
+        feed(world, args.bullets)
+        world.step()
+        world.pop_events()
+        live.append(len(world.ammos))
+
+    result = measure(step, args.ticks)
+    result['tanks'] = len(world.tanks())
+    result['bullets'] = summarize(live)
+    return result
+
+
+def bench_scene(args):
+    from PySide2.QtWidgets import QApplication, QGraphicsView
+    from src.scene import GameScene
+    from src.sprite import sprites
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    sprites.preload()
+    GameConfig.enemies = args.enemies
+    random.seed(args.seed)
+    scene = GameScene()
+    view = QGraphicsView(scene)
+    view.resize(GameConfig.view_width() + 5, GameConfig.view_height() + 5)
+    scene.start(1)
+    scene.loop.stop()
+    scene.world.rng.seed(args.seed)
+    live = []
+
+    def step():
+        feed(scene.world, args.bullets)
+        scene.tick()
+        app.processEvents()
+        live.append(len(scene.world.ammos))
+
+    result = measure(step, args.ticks)
+    result['tanks'] = len(scene.world.tanks())
+    result['bullets'] = summarize(live)
+    result['scene_items'] = len(scene.items())
+    result['sprites'] = sprites.stats()
+    return result
+
+
+render_variants = [
+    ('viewport_update=full', {'viewport_update': 'full'}),
+    ('viewport_update=smart', {'viewport_update': 'smart'}),
+    ('viewport_update=bounding', {'viewport_update': 'bounding'}),
+    ('optimize_view', {'optimize_view': True}),
+    ('background_cache', {'background_cache': True}),
+    ('tank_cache=item', {'tank_cache': 'item'}),
+    ('tank_cache=device', {'tank_cache': 'device'}),
+    ('ammo_cache=item', {'ammo_cache': 'item'}),
+    ('ammo_cache=device', {'ammo_cache': 'device'}),
+    ('terrain_cache=item', {'terrain_cache': 'item'}),
+    ('terrain_cache=device', {'terrain_cache': 'device'}),
+    ('scene_index=none', {'scene_index': 'none'}),
+    ('bsp_depth=4', {'bsp_depth': 4}),
+    ('bsp_depth=8', {'bsp_depth': 8}),
+]
+
+
+def bench_render(args):
+    from PySide2.QtWidgets import QApplication
+    from src.controls import AimBot
+    from src.scene import GameScene
+    from src.sprite import sprites
+    from src.view import GameView
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    sprites.preload()
+    GameConfig.enemies = args.enemies
+    variants = [('mode=%s' % name, name, {}) for name in GameConfig.render_modes()]
+    variants += [(label, 'default', settings) for label, settings in render_variants]
+    modes = {}
+    for label, mode, settings in variants:
+        GameConfig.set_render_mode(mode)
+        for key, value in settings.items():
+            setattr(GameConfig, key, value)
+        random.seed(args.seed)
+        scene = GameScene()
+        view = GameView()
+        view.setScene(scene)
+        view.resize(GameConfig.view_width() + 5, GameConfig.view_height() + 5)
+        view.show()
+        scene.controls.attach(0, AimBot(args.seed))
+        scene.start(1)
+        scene.loop.stop()
+        scene.world.rng.seed(args.seed)
+        app.processEvents()
+        paints = []
+
+        def step():
+            feed(scene.world, args.bullets)
+            scene.tick()
+            start = time.perf_counter()
+            app.processEvents()
+            paints.append((time.perf_counter() - start) * 1000)
+
+        result = measure(step, args.ticks)
+        result['paint_ms'] = summarize(paints)
+        result['settings'] = GameConfig.render_settings()
+        modes[label] = result
+        print('  %-26s paint p50 %7.4f ms  p99 %7.4f ms  tick p50 %7.4f ms' % (
+            label, result['paint_ms']['p50'], result['paint_ms']['p99'], result['tick_ms']['p50']))
+        view.close()
+        view.deleteLater()
+        app.processEvents()
+    GameConfig.set_render_mode('default')
+    return {'tick_ms': modes['mode=default']['tick_ms'], 'paint_ms': modes['mode=default']['paint_ms'],
+            'modes': modes}
+
+
+benches = {
+    'mapgen': bench_mapgen,
+    'collision': bench_collision,
+    'world': bench_world,
+    'scene': bench_scene,
+    'render': bench_render,
+}
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        for p in ('p50', 'p99'):
+            a, b = before['tick_ms'][p], result['tick_ms'][p]
+            print('%-10s %s %9.4f ms -> %9.4f ms  x%.2f' % (name, p, a, b, b / a if a else float('inf')))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the tick, collision and map generation hot paths.')
+    parser.add_argument('benches', nargs='*', help='any of %s (default: all)' % ', '.join(benches))
+    parser.add_argument('--ticks', type=int, default=500)
+    parser.add_argument('--enemies', type=int, default=GameConfig.enemies)
+    parser.add_argument('--bullets', type=int, default=10)
+    parser.add_argument('--columns', type=int, default=GameConfig.columns)
+    parser.add_argument('--rows', type=int, default=GameConfig.rows)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='compare against a previous JSON result file')
+    args = parser.parse_args(argv)
+    for name in args.benches:
+        if name not in benches:
+            parser.error('unknown benchmark: %s' % name)
+    args.benches = args.benches or list(benches)
+    GameConfig.columns = args.columns
+    GameConfig.rows = args.rows
+
+    results = {}
+    for name in args.benches:
+        results[name] = benches[name](args)
+        tick = results[name]['tick_ms']
+        print('%-10s p50 %9.4f ms  p99 %9.4f ms  max %9.4f ms' % (name, tick['p50'], tick['p99'], tick['max']))
+    report = {
+        'meta': {
+            'revision': revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return report
+
+
+if __name__ == '__main__':
+    main()
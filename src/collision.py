@@ -0,0 +1,180 @@
+import math
+
+from src.base import Direction, TerrainMap, TerrainType, ammo_passable_flags, tank_passable_flags
+from src.config import GameConfig
+
+
+def overlap(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def swept(rect, direction: Direction, distance: float):
+    x, y, w, h = rect
+    if direction == Direction.UP:
+        return x, y - distance, w, h + distance
+    elif direction == Direction.DOWN:
+        return x, y, w, h + distance
+    elif direction == Direction.LEFT:
+        return x - distance, y, w + distance, h
+    return x, y, w + distance, h
+
+
+def approach(rect, direction: Direction, target):
+    x, y, w, h = rect
+    tx, ty, tw, th = target
+    if direction == Direction.UP or direction == Direction.DOWN:
+        if not (x < tx + tw and tx < x + w):
+            return None
+        if direction == Direction.UP:
+            return None if ty >= y + h else y - (ty + th)
+        return None if ty + th <= y else ty - (y + h)
+    if not (y < ty + th and ty < y + h):
+        return None
+    if direction == Direction.LEFT:
+        return None if tx >= x + w else x - (tx + tw)
+    return None if tx + tw <= x else tx - (x + w)
+
+
+class TerrainGrid(object):
+    def __init__(self, terrain_map: TerrainMap, size=GameConfig.cube_size / 2):
+        self.size = size
+        self.rows = terrain_map.rows * 2
+        self.columns = terrain_map.columns * 2
+        self.kinds = bytearray(self.rows * self.columns)
+        self.tank_blocked = bytearray(self.rows * self.columns)
+        self.ammo_blocked = bytearray(self.rows * self.columns)
+        blank = TerrainType.BLANK.index
+        for k, cell in enumerate(terrain_map.cells):
+            kind = cell >> 4
+            if kind == blank:
+                continue
+            r, c = divmod(k, terrain_map.columns)
+            for index in range(4):
+                if cell >> index & 1:
+                    self.fill(r * 2 + index // 2, c * 2 + index % 2, kind)
+
+    def fill(self, row: int, column: int, kind: int):
+        i = row * self.columns + column
+        self.kinds[i] = kind
+        self.tank_blocked[i] = not tank_passable_flags[kind]
+        self.ammo_blocked[i] = not ammo_passable_flags[kind]
+
+    def clear(self, row: int, column: int):
+        i = row * self.columns + column
+        self.kinds[i] = 0
+        self.tank_blocked[i] = 0
+        self.ammo_blocked[i] = 0
+
+    def span(self, rect):
+        x, y, w, h = rect
+        first_column = max(int(x // self.size), 0)
+        last_column = min(math.ceil((x + w) / self.size), self.columns) - 1
+        first_row = max(int(y // self.size), 0)
+        last_row = min(math.ceil((y + h) / self.size), self.rows) - 1
+        return first_row, last_row, first_column, last_column
+
+    def blocked(self, cells: bytearray, rect):
+        first_row, last_row, first_column, last_column = self.span(rect)
+        for row in range(first_row, last_row + 1):
+            offset = row * self.columns
+            for i in range(offset + first_column, offset + last_column + 1):
+                if cells[i]:
+                    return True
+        return False
+
+    def tank_blocked_in(self, rect):
+        return self.blocked(self.tank_blocked, rect)
+
+    def raycast(self, rect, direction: Direction, cells=None, limit=None, ignore=frozenset()):
+        if cells is None:
+            cells = self.ammo_blocked
+        x, y, w, h = rect
+        s = self.size
+        vertical = direction == Direction.UP or direction == Direction.DOWN
+        if vertical:
+            lane = range(max(int(x // s), 0), min(math.ceil((x + w) / s), self.columns))
+            if direction == Direction.UP:
+                lines = range(min(math.ceil((y + h) / s), self.rows) - 1, -1, -1)
+            else:
+                lines = range(max(int(y // s), 0), self.rows)
+        else:
+            lane = range(max(int(y // s), 0), min(math.ceil((y + h) / s), self.rows))
+            if direction == Direction.LEFT:
+                lines = range(min(math.ceil((x + w) / s), self.columns) - 1, -1, -1)
+            else:
+                lines = range(max(int(x // s), 0), self.columns)
+        for line in lines:
+            if direction == Direction.UP:
+                distance = y - (line + 1) * s
+            elif direction == Direction.DOWN:
+                distance = line * s - (y + h)
+            elif direction == Direction.LEFT:
+                distance = x - (line + 1) * s
+            else:
+                distance = line * s - (x + w)
+            if limit is not None and distance >= limit:
+                return None
+            hits = []
+            for other in lane:
+                row, column = (line, other) if vertical else (other, line)
+                k = row * self.columns + column
+                if cells[k] and self.kinds[k] not in ignore:
+                    hits.append((row, column))
+            if hits:
+                return distance, hits
+        return None
+
+    def hits(self, rect):
+        hits = []
+        first_row, last_row, first_column, last_column = self.span(rect)
+        for row in range(first_row, last_row + 1):
+            offset = row * self.columns
+            for column in range(first_column, last_column + 1):
+                kind = self.kinds[offset + column]
+                if kind:
+                    hits.append((kind, row, column))
+        return hits
+
+
+class SpatialHash(object):
+    def __init__(self, size=GameConfig.cube_size):
+        self.size = size
+        self.buckets = {}
+        self.keys = {}
+
+    def cell_keys(self, rect):
+        x, y, w, h = rect
+        first_column = int(x // self.size)
+        last_column = math.ceil((x + w) / self.size) - 1
+        first_row = int(y // self.size)
+        last_row = math.ceil((y + h) / self.size) - 1
+        return tuple((r, c) for r in range(first_row, last_row + 1) for c in range(first_column, last_column + 1))
+
+    def insert(self, obj):
+        keys = self.cell_keys(obj.rect())
+        self.keys[obj] = keys
+        for key in keys:
+            self.buckets.setdefault(key, []).append(obj)
+
+    def remove(self, obj):
+        for key in self.keys.pop(obj, ()):
+            bucket = self.buckets[key]
+            bucket.remove(obj)
+            if not bucket:
+                del self.buckets[key]
+
+    def update(self, obj):
+        keys = self.cell_keys(obj.rect())
+        if keys != self.keys.get(obj):
+            self.remove(obj)
+            self.keys[obj] = keys
+            for key in keys:
+                self.buckets.setdefault(key, []).append(obj)
+
+    def query(self, rect):
+        found = []
+        for key in self.cell_keys(rect):
+            for obj in self.buckets.get(key, ()):
+                if obj not in found and overlap(rect, obj.rect()):
+                    found.append(obj)
+        return found
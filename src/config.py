@@ -2,16 +2,44 @@ class GameConfig(object):
     cube_size = 60
     rows = 10
     columns = 13
+    view_rows = 10
+    view_columns = 13
+    chunk_size = 8
+    release_radius = 2
+    enemies = 3
     interval = 20
+    ai_interval = 1000
+    far_ai_factor = 4
+    viewport_update = 'minimal'
+    optimize_view = False
+    background_cache = False
+    tank_cache = 'none'
+    ammo_cache = 'none'
+    terrain_cache = 'none'
+    scene_index = 'bsp'
+    bsp_depth = 0
 
     _blank_wight = 0.6
     _brink_weight = 0.2
     _steel_weight = 0.1
     _grass_weight = 0.05
     _water_weight = 0.05
+    _layout_rows = 10
+    _layout_columns = 13
     _blank_area = [(0, 0), (0, 6), (0, 12), (9, 4), (9, 8), (9, 6)]
     _steel_area = [(5, 6)]
     _brink_area = [(9, 5), (9, 7), (8, 5), (8, 6), (8, 7)]
+    _base_cell = (9, 6)
+    _player_cells = [4, 8]
+    _enemy_cells = [0, 6, 12]
+    _render_modes = {
+        'default': {'viewport_update': 'minimal', 'optimize_view': False, 'background_cache': False,
+                    'tank_cache': 'none', 'ammo_cache': 'none', 'terrain_cache': 'none', 'scene_index': 'bsp',
+                    'bsp_depth': 0},
+        'fast': {'viewport_update': 'minimal', 'optimize_view': True, 'background_cache': True,
+                 'tank_cache': 'none', 'ammo_cache': 'none', 'terrain_cache': 'none', 'scene_index': 'bsp',
+                 'bsp_depth': 0},
+    }
 
     @classmethod
     def width(cls):
@@ -21,18 +49,61 @@ class GameConfig(object):
     def height(cls):
         return cls.rows * cls.cube_size
 
+    @classmethod
+    def view_width(cls):
+        return cls.view_columns * cls.cube_size
+
+    @classmethod
+    def view_height(cls):
+        return cls.view_rows * cls.cube_size
+
+    @classmethod
+    def tick_rate(cls):
+        return 1000 / cls.interval
+
+    @classmethod
+    def render_modes(cls):
+        return list(cls._render_modes)
+
+    @classmethod
+    def render_settings(cls):
+        return {key: getattr(cls, key) for key in cls._render_modes['default']}
+
+    @classmethod
+    def set_render_mode(cls, name: str):
+        for key, value in cls._render_modes[name].items():
+            setattr(cls, key, value)
+
     @classmethod
     def terrain_weights(cls):
         return [cls._blank_wight, cls._brink_weight, cls._steel_weight, cls._grass_weight, cls._water_weight]
 
     @classmethod
-    def blank_area(cls):
-        return cls._blank_area
+    def layout(cls, area, columns=None, rows=None):
+        columns_offset = ((columns or cls.columns) - cls._layout_columns) // 2
+        rows_offset = (rows or cls.rows) - cls._layout_rows
+        return [(i + rows_offset if i >= cls._layout_rows // 2 else i, j + columns_offset) for (i, j) in area]
+
+    @classmethod
+    def blank_area(cls, columns=None, rows=None):
+        return cls.layout(cls._blank_area, columns, rows)
+
+    @classmethod
+    def brink_area(cls, columns=None, rows=None):
+        return cls.layout(cls._brink_area, columns, rows)
+
+    @classmethod
+    def steel_area(cls, columns=None, rows=None):
+        return cls.layout(cls._steel_area, columns, rows)
+
+    @classmethod
+    def base_cell(cls, columns=None, rows=None):
+        return cls.layout([cls._base_cell], columns, rows)[0]
 
     @classmethod
-    def brink_area(cls):
-        return cls._brink_area
+    def player_cells(cls, columns=None):
+        return [j for (_, j) in cls.layout([(0, j) for j in cls._player_cells], columns)]
 
     @classmethod
-    def steel_area(cls):
-        return cls._steel_area
+    def enemy_cells(cls, columns=None):
+        return [j for (_, j) in cls.layout([(0, j) for j in cls._enemy_cells], columns)]
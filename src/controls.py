@@ -0,0 +1,175 @@
+import os
+import random
+import struct
+
+from src.base import Direction
+from src.config import GameConfig
+from src.replay import command
+
+fire = 'fire'
+bits = {
+    Direction.UP: 0x01,
+    Direction.LEFT: 0x02,
+    Direction.DOWN: 0x04,
+    Direction.RIGHT: 0x08,
+    fire: 0x10,
+}
+half_size = GameConfig.cube_size // 2
+
+
+class InputState(object):
+    def __init__(self):
+        self.mask = 0
+        self.order = {}
+        self.presses = 0
+        self.fired = False
+
+    def press(self, action):
+        self.mask |= bits[action]
+        if action == fire:
+            self.fired = True
+        else:
+            self.presses += 1
+            self.order[action] = self.presses
+
+    def release(self, action):
+        self.mask &= ~bits[action]
+
+    def clear(self):
+        self.mask = 0
+        self.fired = False
+
+    def direction(self):
+        held = [direction for direction in Direction if self.mask & bits[direction]]
+        return max(held, key=self.order.get) if held else None
+
+    def sample(self, world=None, tank=None):
+        value = command(self.direction(), self.fired)
+        self.fired = False
+        return value
+
+
+class Keyboard(object):
+    def __init__(self, bindings, players=2):
+        self.bindings = bindings
+        self.players = [InputState() for _ in range(players)]
+
+    def key(self, key: int, pressed: bool):
+        binding = self.bindings.get(key)
+        if binding is None:
+            return False
+        player, action = binding
+        if pressed:
+            self.players[player].press(action)
+        else:
+            self.players[player].release(action)
+        return True
+
+    def clear(self):
+        for state in self.players:
+            state.clear()
+
+
+class Gamepad(object):
+    event_format = struct.Struct('<IhBB')
+    button_event = 0x01
+    axis_event = 0x02
+    threshold = 16384
+    stick_axes = (0, 1)
+    hat_axes = (6, 7)
+
+    def __init__(self, index=0):
+        self.state = InputState()
+        self.axes = {}
+        try:
+            self.device = os.open('/dev/input/js%d' % index, os.O_RDONLY | os.O_NONBLOCK)
+        except OSError:
+            self.device = None
+
+    def poll(self):
+        while self.device is not None:
+            try:
+                data = os.read(self.device, self.event_format.size * 16)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.device = None
+                return
+            for offset in range(0, len(data) - self.event_format.size + 1, self.event_format.size):
+                _, value, kind, number = self.event_format.unpack_from(data, offset)
+                if kind & self.button_event and number == 0:
+                    if value:
+                        self.state.press(fire)
+                    else:
+                        self.state.release(fire)
+                elif kind & self.axis_event and number in self.stick_axes + self.hat_axes:
+                    self.axes[number] = value
+            self.update()
+
+    def update(self):
+        x, y = [self.axes.get(hat, 0) or self.axes.get(stick, 0) for stick, hat in zip(self.stick_axes, self.hat_axes)]
+        for direction, pressed in ((Direction.LEFT, x < -self.threshold), (Direction.RIGHT, x > self.threshold),
+                                   (Direction.UP, y < -self.threshold), (Direction.DOWN, y > self.threshold)):
+            if pressed and not self.state.mask & bits[direction]:
+                self.state.press(direction)
+            elif not pressed:
+                self.state.release(direction)
+
+    def sample(self, world=None, tank=None):
+        self.poll()
+        return self.state.sample()
+
+
+class RandomBot(object):
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.direction = None
+
+    def sample(self, world=None, tank=None):
+        if self.rng.random() < 0.05:
+            self.direction = self.rng.choice(list(Direction)) if self.rng.random() < 0.8 else None
+        return command(self.direction, self.rng.random() < 0.05)
+
+
+class AimBot(object):
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.direction = Direction.UP
+        self.last = None
+
+    def sample(self, world, tank):
+        for enemy in world.enemies:
+            dx, dy = enemy.x - tank.x, enemy.y - tank.y
+            if abs(dx) < half_size:
+                direction = Direction.DOWN if dy > 0 else Direction.UP
+            elif abs(dy) < half_size:
+                direction = Direction.RIGHT if dx > 0 else Direction.LEFT
+            else:
+                continue
+            if world.can_hit(tank, enemy, direction):
+                if tank.direction == direction:
+                    return command(None, True)
+                return command(direction)
+        if world.tick % 25 == 0 or (tank.x, tank.y) == self.last:
+            self.direction = self.rng.choice((Direction.UP, Direction.UP, Direction.LEFT, Direction.RIGHT,
+                                              Direction.DOWN))
+        self.last = (tank.x, tank.y)
+        return command(self.direction, self.rng.random() < 0.05)
+
+
+class Controls(object):
+    def __init__(self, sources=None):
+        self.sources = list(sources or [])
+
+    def attach(self, slot: int, source):
+        while len(self.sources) <= slot:
+            self.sources.append(None)
+        self.sources[slot] = source
+
+    def sample(self, world):
+        commands = bytearray(len(world.roster))
+        for slot, tank in enumerate(world.roster):
+            source = self.sources[slot] if slot < len(self.sources) else None
+            if source is not None and tank.lives > 0:
+                commands[slot] = source.sample(world, tank)
+        return bytes(commands)
@@ -1,195 +1,196 @@
-from PySide2.QtCore import QTimer, Qt
-from PySide2.QtGui import QPixmap
-from PySide2.QtWidgets import QGraphicsPixmapItem
-import random
+from PySide2.QtCore import QRectF, Qt
+from PySide2.QtGui import QImage, QPainter, QPixmap
+from PySide2.QtWidgets import QGraphicsItem, QGraphicsPixmapItem
 
-from .base import Direction, Tank, TerrainType
+from .base import Ammo, Direction, Tank, TerrainMap, TerrainType
+from .collision import overlap
 from .config import GameConfig
+from .profiler import profiler
+from .sprite import sprites
 
 cube_size = GameConfig.cube_size
-interval = GameConfig.interval
-content_width = GameConfig.width()
-content_height = GameConfig.height()
-
-
-class TerrainItem(QGraphicsPixmapItem):
-    def __init__(self, png: QPixmap, terrain: TerrainType):
-        super().__init__(png)
-        self.terrain = terrain
+rotations = {
+    Direction.UP: 0,
+    Direction.DOWN: 180,
+    Direction.LEFT: 270,
+    Direction.RIGHT: 90,
+}
+cache_modes = {
+    'none': QGraphicsItem.NoCache,
+    'item': QGraphicsItem.ItemCoordinateCache,
+    'device': QGraphicsItem.DeviceCoordinateCache,
+}
+ground_terrains = (TerrainType.BRINK, TerrainType.STEEL, TerrainType.WATER)
+grass_terrains = (TerrainType.GRASS,)
+
+
+def render_terrain(terrain_map: TerrainMap, terrains, row: int, column: int, rows: int, columns: int):
+    rows = min(rows, terrain_map.rows - row)
+    columns = min(columns, terrain_map.columns - column)
+    size = int(cube_size / 2)
+    image = None
+    painter = None
+    for r in range(row, row + rows):
+        for c in range(column, column + columns):
+            terrain, state = terrain_map.get(r, c)
+            if terrain not in terrains or not state:
+                continue
+            if image is None:
+                image = QImage(columns * cube_size, rows * cube_size, QImage.Format_ARGB32_Premultiplied)
+                image.fill(Qt.transparent)
+                painter = QPainter(image)
+            tile = sprites.tile(terrain.pic, size)
+            for index in range(4):
+                if state >> index & 1:
+                    painter.drawImage((c - column) * cube_size + index % 2 * size,
+                                      (r - row) * cube_size + index // 2 * size, tile)
+    if painter is not None:
+        painter.end()
+    return image
+
+
+class TerrainLayerItem(QGraphicsItem):
+    def __init__(self, terrain_map: TerrainMap, terrains, row=0, column=0, rows=None, columns=None, image=None):
+        super().__init__()
+        self.terrain_map = terrain_map
+        self.terrains = terrains
+        self.row = row
+        self.column = column
+        self.rows = min(rows or terrain_map.rows, terrain_map.rows - row)
+        self.columns = min(columns or terrain_map.columns, terrain_map.columns - column)
+        self.size = int(cube_size / 2)
+        self.rect = QRectF(0, 0, self.columns * cube_size, self.rows * cube_size)
+        self.pixmap = None
+        self.image = image
+        self.setPos(column * cube_size, row * cube_size)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setCacheMode(cache_modes[GameConfig.terrain_cache])
+
+    def render(self):
+        return render_terrain(self.terrain_map, self.terrains, self.row, self.column, self.rows, self.columns)
+
+    def draw(self):
+        image = self.image if self.image is not None else self.render()
+        self.pixmap = QPixmap.fromImage(image) if image is not None else QPixmap()
+        self.image = None
+
+    def release(self):
+        self.pixmap = None
+        self.image = None
+
+    def sub_tile(self, r: int, c: int, index: int):
+        return ((c - self.column) * cube_size + index % 2 * self.size,
+                (r - self.row) * cube_size + index // 2 * self.size, self.size, self.size)
+
+    def clear(self, r: int, c: int, index: int):
+        rect = QRectF(*self.sub_tile(r, c, index))
+        device = self.pixmap if self.pixmap is not None else self.image
+        if device is not None and not device.isNull():
+            painter = QPainter(device)
+            painter.setCompositionMode(QPainter.CompositionMode_Clear)
+            painter.fillRect(rect, Qt.transparent)
+            painter.end()
+        self.update(rect)
+
+    def boundingRect(self):
+        return self.rect
+
+    def paint(self, painter: QPainter, option, widget=None):
+        if self.pixmap is None:
+            self.draw()
+        if not self.pixmap.isNull():
+            rect = option.exposedRect
+            painter.drawPixmap(rect, self.pixmap, rect)
 
 
 class TankItem(QGraphicsPixmapItem):
-    def __init__(self, tank, direction: Direction):
-        png = QPixmap()
-        png.load('../images/%s' % tank.pic)
-        png = png.scaled(cube_size, cube_size)
-        QGraphicsPixmapItem.__init__(self, png)
-        self.directions = []
-        self.direction = direction
-        self.tank = Tank(tank)
-        self.setTransformOriginPoint(cube_size / 2, cube_size / 2)
-        self.move_timer = QTimer()
-        self.move_timer.setInterval(interval)
-        self.move_timer.timeout.connect(self.move)
-        self.move_timer.start()
-
-    def move(self):
-        x, y = self.x(), self.y()
-        if len(self.directions) != 0:
-            d = self.directions[-1]
-            if self.direction != d:
-                self.direction = d
-            if d == Direction.UP:
-                self.setRotation(0)
-                self.moveBy(0, -self.tank.speed)
-            elif d == Direction.DOWN:
-                self.setRotation(180)
-                self.moveBy(0, self.tank.speed)
-            elif d == Direction.LEFT:
-                self.setRotation(270)
-                self.moveBy(-self.tank.speed, 0)
-            else:
-                self.setRotation(90)
-                self.moveBy(self.tank.speed, 0)
-            self.check_edge()
-        else:
-            self.check_pos()
-        self.check_collide(x, y)
-
-    def check_edge(self):
-        if self.x() < 0:
-            self.setX(0)
-        if self.x() > content_width - cube_size:
-            self.setX(content_width - cube_size)
-        if self.y() < 0:
-            self.setY(0)
-        if self.y() > content_height - cube_size:
-            self.setY(content_height - cube_size)
-
-    def check_pos(self):
-        if self.direction == Direction.UP or self.direction == Direction.DOWN:
-            if self.y() % (cube_size / 2) != 0:
-                speed = self.tank.speed if self.direction == Direction.DOWN else -self.tank.speed
-                self.moveBy(0, speed)
-        if self.direction == Direction.LEFT or self.direction == Direction.RIGHT:
-            if self.x() % (cube_size / 2) != 0:
-                speed = self.tank.speed if self.direction == Direction.RIGHT else -self.tank.speed
-                self.moveBy(speed, 0)
-
-    def check_collide(self, x, y):
-        colliding_items = self.collidingItems(mode=Qt.IntersectsItemBoundingRect)
-        back = False
-        for item in colliding_items:
-            if isinstance(item, TankItem):
-                back = True
-                break
-            elif isinstance(item, TerrainItem):
-                if not item.terrain.tank_passable:
-                    back = True
-                    break
-        if back:
-            self.setX(x)
-            self.setY(y)
-
-    def shoot(self):
-        if self.tank.ammo_storage > 0:
-            self.tank.ammo_storage -= 1
-            ammo_png = QPixmap()
-            ammo_png.load('../images/ammo.png')
-            ammo_png = ammo_png.scaled(5, 8)
-            ammo = AmmoItem(ammo_png, self, self.direction)
-            self.scene().addItem(ammo)
+    def __init__(self, tank: Tank):
+        QGraphicsPixmapItem.__init__(self)
+        self.tank = tank
+        self.direction = None
+        self.setCacheMode(cache_modes[GameConfig.tank_cache])
+        self.sync()
+
+    def bind(self, tank: Tank):
+        if tank.pic != self.tank.pic:
+            self.direction = None
+        self.tank = tank
+
+    def sync(self, view=None):
+        visible = view is None or overlap(view, self.tank.rect())
+        if visible != self.isVisible():
+            self.setVisible(visible)
+        if not visible:
+            return
+        if self.direction != self.tank.direction:
+            self.direction = self.tank.direction
+            self.setPixmap(sprites.get(self.tank.pic, cube_size, rotation=rotations[self.direction]))
+        self.setPos(self.tank.x, self.tank.y)
 
     def __str__(self):
         return self.tank.name
 
 
-class EnemyItem(TankItem):
-    def __init__(self, png):
-        super().__init__(png, Direction.DOWN)
-        self.setRotation(180)
-        self.auto_timer = QTimer()
-        self.auto_timer.setInterval(1000)
-        self.auto_timer.timeout.connect(self.auto)
-        self.auto_timer.start()
-
-    def auto(self):
-        change_score = random.randint(0, 99)
-        if change_score < 40:
-            directions = [Direction.UP, Direction.DOWN, Direction.LEFT, Direction.RIGHT]
-            self.directions = [random.choice(directions)]
-        shoot_score = random.randint(0, 99)
-        if shoot_score < 10:
-            self.shoot()
-
-
 class AmmoItem(QGraphicsPixmapItem):
-    def __init__(self, png, tank_item: TankItem, direction: Direction):
-        QGraphicsPixmapItem.__init__(self, png)
-
-        self.tank_item = tank_item
-        self.tank = tank_item.tank
-        self.direction = direction
-        self.available = True
-
-        if self.direction == Direction.UP:
-            self.setX(self.tank_item.x() + cube_size / 2 - 3)
-            self.setY(self.tank_item.y())
-        elif self.direction == Direction.DOWN:
-            self.setX(self.tank_item.x() + cube_size / 2 + 3)
-            self.setY(self.tank_item.y() + cube_size)
-            self.setRotation(180)
-        elif self.direction == Direction.LEFT:
-            self.setX(self.tank_item.x())
-            self.setY(self.tank_item.y() + cube_size / 2 + 3)
-            self.setRotation(270)
-        elif self.direction == Direction.RIGHT:
-            self.setX(self.tank_item.x() + cube_size)
-            self.setY(self.tank_item.y() + cube_size / 2 - 3)
-            self.setRotation(90)
-
-        self.timer = QTimer()
-        self.timer.setInterval(interval)
-        self.timer.timeout.connect(self.move)
-        self.timer.start()
-
-    def move(self):
-        if self.available:
-            if self.direction == Direction.UP:
-                self.moveBy(0, -self.tank.ammo_speed)
-            elif self.direction == Direction.DOWN:
-                self.moveBy(0, self.tank.ammo_speed)
-            elif self.direction == Direction.LEFT:
-                self.moveBy(-self.tank.ammo_speed, 0)
-            elif self.direction == Direction.RIGHT:
-                self.moveBy(self.tank.ammo_speed, 0)
-            self.check_edge()
-            self.check_collide()
-
-    def check_edge(self):
-        if self.x() < 0 or self.x() > content_width or self.y() < 0 or self.y() > content_height:
-            self.destroy()
-
-    def check_collide(self):
-        colliding_items = self.collidingItems(mode=Qt.IntersectsItemBoundingRect)
-        if len(colliding_items) > 0:
-            self.hit(colliding_items)
-            pass
-
-    def hit(self, items):
-        destroy = False
-        for item in items:
-            if isinstance(item, TerrainItem):
-                if item.terrain.destroyable and self.tank.power >= item.terrain.strength:
-                    item.scene().removeItem(item)
-                if not item.terrain.ammo_passable:
-                    destroy = True
-            if isinstance(item, TankItem):
-                destroy = True
-        if destroy:
-            self.destroy()
-
-    def destroy(self):
-        self.available = False
-        self.tank.ammo_storage += 1
-        self.scene().removeItem(self)
+    def __init__(self, ammo=None):
+        QGraphicsPixmapItem.__init__(self)
+        self.ammo = None
+        self.direction = None
+        self.setCacheMode(cache_modes[GameConfig.ammo_cache])
+        if ammo is not None:
+            self.bind(ammo)
+
+    def bind(self, ammo: Ammo):
+        self.ammo = ammo
+        if self.direction != ammo.direction:
+            self.direction = ammo.direction
+            self.setPixmap(sprites.get('ammo.png', Ammo.width, Ammo.length, rotations[self.direction]))
+        self.sync()
+
+    def sync(self, view=None):
+        rect = self.ammo.rect()
+        visible = view is None or overlap(view, rect)
+        if visible != self.isVisible():
+            self.setVisible(visible)
+        if visible:
+            self.setPos(rect[0], rect[1])
+
+
+class AmmoItemPool(object):
+    def __init__(self, scene):
+        self.scene = scene
+        self.free = []
+        self.live = {}
+
+    def reserve(self, count: int):
+        for _ in range(count):
+            self.free.append(self.create())
+
+    def create(self):
+        item = AmmoItem()
+        item.setVisible(False)
+        self.scene.addItem(item)
+        profiler.count('items_created')
+        return item
+
+    def acquire(self, ammo: Ammo):
+        item = self.free.pop() if self.free else self.create()
+        item.bind(ammo)
+        item.setVisible(True)
+        self.live[ammo] = item
+        profiler.count('items_added')
+        return item
+
+    def release(self, ammo: Ammo):
+        item = self.live.pop(ammo)
+        item.setVisible(False)
+        item.ammo = None
+        self.free.append(item)
+        profiler.count('items_removed')
+
+    def sync(self, view=None):
+        for item in self.live.values():
+            item.sync(view)
+
+    def stats(self):
+        return {'live': len(self.live), 'pooled': len(self.free)}
@@ -0,0 +1,207 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from src.base import TerrainMap, TerrainType, generate_map, map_seeds
+from src.config import GameConfig
+from src.world import World, enemy_types, player_types
+
+magic = b'QTLP'
+version = 1
+header_format = struct.Struct('<4sBI')
+index_format = struct.Struct('<QHH')
+level_format = struct.Struct('<IBB')
+spawn_format = struct.Struct('<HH')
+type_bits = max(t.index for t in TerrainType).bit_length()
+state_bits = 4
+low_nibbles = bytes(k & 15 for k in range(256))
+high_nibbles = bytes(k >> 4 for k in range(256))
+high_shift = bytes(k << 4 & 0xff for k in range(256))
+
+
+def packed_size(count: int, bits: int):
+    return (count + 7) // 8 * bits
+
+
+def pack(values, bits: int):
+    data = bytearray()
+    for k in range(0, len(values), 8):
+        word = 0
+        for n, value in enumerate(values[k:k + 8]):
+            word |= value << n * bits
+        data += word.to_bytes(bits, 'little')
+    return bytes(data)
+
+
+def unpack(data, offset: int, count: int, bits: int):
+    if bits == 4:
+        packed = data[offset:offset + packed_size(count, bits)]
+        values = bytearray(len(packed) * 2)
+        values[0::2] = packed.translate(low_nibbles)
+        values[1::2] = packed.translate(high_nibbles)
+        return values[:count]
+    mask = (1 << bits) - 1
+    values = bytearray(count)
+    for k in range(0, count, 8):
+        start = offset + k // 8 * bits
+        word = int.from_bytes(data[start:start + bits], 'little')
+        for n in range(min(8, count - k)):
+            values[k + n] = word >> n * bits & mask
+    return values
+
+
+class Level(object):
+    def __init__(self, columns: int, rows: int, cells, seed=0, player_spawns=None, enemy_spawns=None):
+        self.columns = columns
+        self.rows = rows
+        self.cells = cells
+        self.seed = seed
+        if player_spawns is None:
+            player_spawns = [(rows - 1, j) for j in GameConfig.player_cells(columns)]
+        if enemy_spawns is None:
+            enemy_spawns = [(0, j) for j in GameConfig.enemy_cells(columns)]
+        self.player_spawns = [(i, j) for i, j in player_spawns if 0 <= i < rows and 0 <= j < columns]
+        self.enemy_spawns = [(i, j) for i, j in enemy_spawns if 0 <= i < rows and 0 <= j < columns]
+
+    @classmethod
+    def from_map(cls, terrain_map: TerrainMap, player_spawns=None, enemy_spawns=None):
+        return cls(terrain_map.columns, terrain_map.rows, bytes(terrain_map.cells), terrain_map.seed or 0,
+                   player_spawns, enemy_spawns)
+
+    def terrain_map(self):
+        return TerrainMap(self.columns, self.rows, bytearray(self.cells), self.seed)
+
+    def world(self, players: int, enemies: int, seed=None):
+        world = World(self.terrain_map(), self.seed if seed is None else seed)
+        for k, (i, j) in enumerate(self.player_spawns[:players]):
+            world.add_player(player_types[k], j, i)
+        cells = [(i, j) for i, j in self.enemy_spawns if world.cell_free(i, j)][:enemies]
+        for k, (i, j) in enumerate(cells):
+            world.add_enemy(enemy_types[k % len(enemy_types)], j, i)
+        for k, (i, j) in enumerate(world.spawn_cells(enemies - len(cells)), len(cells)):
+            world.add_enemy(enemy_types[k % len(enemy_types)], j, i)
+        return world
+
+    def encode(self):
+        chunks = [level_format.pack(self.seed, len(self.player_spawns), len(self.enemy_spawns))]
+        for i, j in self.player_spawns + self.enemy_spawns:
+            chunks.append(spawn_format.pack(i, j))
+        chunks.append(pack([cell >> 4 for cell in self.cells], type_bits))
+        chunks.append(pack([cell & 15 for cell in self.cells], state_bits))
+        return b''.join(chunks)
+
+    @classmethod
+    def decode(cls, data, offset: int, columns: int, rows: int):
+        seed, player_count, enemy_count = level_format.unpack_from(data, offset)
+        offset += level_format.size
+        spawns = [spawn_format.unpack_from(data, offset + k * spawn_format.size)
+                  for k in range(player_count + enemy_count)]
+        offset += len(spawns) * spawn_format.size
+        count = columns * rows
+        types = unpack(data, offset, count, type_bits)
+        states = unpack(data, offset + packed_size(count, type_bits), count, state_bits)
+        cells = (int.from_bytes(types.translate(high_shift), 'little') |
+                 int.from_bytes(states, 'little')).to_bytes(count, 'little')
+        return cls(columns, rows, cells, seed, spawns[:player_count], spawns[player_count:])
+
+
+def write(path: str, levels):
+    levels = list(levels)
+    offset = header_format.size + len(levels) * index_format.size
+    index = []
+    records = []
+    for level in levels:
+        record = level.encode()
+        index.append(index_format.pack(offset, level.columns, level.rows))
+        records.append(record)
+        offset += len(record)
+    with open(path, 'wb') as f:
+        f.write(header_format.pack(magic, version, len(levels)))
+        f.write(b''.join(index))
+        for record in records:
+            f.write(record)
+    return path
+
+
+class LevelPack(object):
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < header_format.size:
+                raise ValueError('%s is not a version %d level pack' % (path, version))
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        name, number, self.count = header_format.unpack_from(self.data)
+        if name != magic or number != version:
+            self.data.close()
+            raise ValueError('%s is not a version %d level pack' % (path, version))
+        if size < header_format.size + self.count * index_format.size:
+            self.data.close()
+            raise ValueError('%s is truncated: index for %d levels does not fit' % (path, self.count))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n: int):
+        if not -self.count <= n < self.count:
+            raise IndexError('level %d out of range (%d levels)' % (n, self.count))
+        offset, columns, rows = index_format.unpack_from(self.data, header_format.size + n % self.count *
+                                                         index_format.size)
+        if offset + level_format.size > len(self.data):
+            raise ValueError('%s is truncated at level %d' % (self.path, n))
+        _, player_count, enemy_count = level_format.unpack_from(self.data, offset)
+        count = columns * rows
+        end = offset + level_format.size + (player_count + enemy_count) * spawn_format.size + \
+            packed_size(count, type_bits) + packed_size(count, state_bits)
+        if end > len(self.data):
+            raise ValueError('%s is truncated at level %d' % (self.path, n))
+        return Level.decode(self.data, offset, columns, rows)
+
+    def close(self):
+        self.data.close()
+
+
+def build(args):
+    seeds = map_seeds(args.seed, args.levels)
+    start = time.perf_counter()
+    write(args.path, (Level.from_map(generate_map(args.columns, args.rows, seed)) for seed in seeds))
+    print('%s: %d levels of %dx%d in %.2f s' % (args.path, args.levels, args.columns, args.rows,
+                                                 time.perf_counter() - start))
+
+
+def info(args):
+    start = time.perf_counter()
+    levels = LevelPack(args.path)
+    opened = time.perf_counter()
+    level = levels[args.level]
+    loaded = time.perf_counter()
+    print('%s: %d levels, opened in %.3f ms' % (args.path, len(levels), (opened - start) * 1000))
+    print('level %d: %dx%d, seed %d, %d player / %d enemy spawns, loaded in %.3f ms' % (
+        args.level, level.columns, level.rows, level.seed, len(level.player_spawns), len(level.enemy_spawns),
+        (loaded - opened) * 1000))
+    levels.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build and inspect binary level packs.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='pack generated levels into a file')
+    build_parser.add_argument('path')
+    build_parser.add_argument('--levels', type=int, default=1000)
+    build_parser.add_argument('--columns', type=int, default=GameConfig.columns)
+    build_parser.add_argument('--rows', type=int, default=GameConfig.rows)
+    build_parser.add_argument('--seed', type=int, default=0)
+    info_parser = commands.add_parser('info', help='open a pack and load one level')
+    info_parser.add_argument('path')
+    info_parser.add_argument('--level', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        build(args)
+    else:
+        info(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import math
+import time
+
+from PySide2.QtCore import QTimer, Qt
+
+from src.config import GameConfig
+from src.profiler import profiler
+
+
+class GameLoop(object):
+    def __init__(self, step, tick_rate=None, max_steps=5):
+        self.step = step
+        self.max_steps = max_steps
+        self.speed = 1.0
+        self.paused = False
+        self.tick = 0
+        self.frame_time = 0.0
+        self.step_time = 0.0
+        self.average_step_time = 0.0
+        self.dropped_ticks = 0
+        self._accumulator = 0.0
+        self._last = None
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.frame)
+        self.tick_rate = 0
+        self.interval = 0.0
+        self.set_tick_rate(tick_rate or GameConfig.tick_rate())
+
+    def set_tick_rate(self, tick_rate: float):
+        self.tick_rate = tick_rate
+        self.interval = 1000 / tick_rate
+        self.timer.setInterval(max(1, int(self.interval)))
+
+    def set_speed(self, speed: float):
+        self.speed = speed
+
+    def ticks(self, milliseconds: float):
+        return max(1, round(milliseconds / self.interval))
+
+    def start(self):
+        self._last = time.perf_counter()
+        self._accumulator = 0.0
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def is_running(self):
+        return self.timer.isActive()
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self._last = time.perf_counter()
+        self._accumulator = 0.0
+
+    def step_once(self):
+        start = time.perf_counter()
+        self.step()
+        self.tick += 1
+        self.step_time = (time.perf_counter() - start) * 1000
+        self.average_step_time += (self.step_time - self.average_step_time) * 0.05
+
+    def frame(self):
+        now = time.perf_counter()
+        elapsed = (now - self._last) * 1000
+        self._last = now
+        self.frame_time = elapsed
+        if self.paused:
+            return
+        profiler.begin_frame()
+        profiler.count('timers')
+        self._accumulator += elapsed * self.speed
+        steps = 0
+        budget = max(self.max_steps, math.ceil(self.max_steps * self.speed))
+        while self._accumulator >= self.interval:
+            if steps >= budget:
+                self.dropped_ticks += int(self._accumulator // self.interval)
+                self._accumulator %= self.interval
+                break
+            self._accumulator -= self.interval
+            self.step_once()
+            steps += 1
+            if not self.timer.isActive():
+                break
+        profiler.end_frame()
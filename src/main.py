@@ -1,50 +1,158 @@
+import os
 import sys
+import time
 
-from PySide2.QtCore import QRect
-from PySide2.QtWidgets import QApplication, QMainWindow, QGraphicsView, QWidget
+started = time.perf_counter()
+
+from PySide2.QtCore import QRect, Qt
+from PySide2.QtWidgets import QApplication, QMainWindow, QWidget
 
 from src.config import GameConfig
-from src.scene import GameScene, StartScene, MaskScene
+from src.controls import Gamepad
+from src.levelpack import LevelPack
+from src.profiler import profiler
+from src.replay import Replay
+from src.scene import Curtain, GameScene, StartScene
+from src.sprite import sprites
+from src.stage import Stage
+from src.view import GameView
 
-content_height = GameConfig.height()
-content_width = GameConfig.width()
+content_height = GameConfig.view_height()
+content_width = GameConfig.view_width()
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, replay=None, record_path=None, session=None):
         QMainWindow.__init__(self)
-        self.game_scene = GameScene()
-        self.mask_scene = MaskScene(self)
-        self.start_scene = StartScene(self.mask_scene)
+        sprites.preload()
+        self.record_path = record_path
+        self.staged = replay is None and session is None
+        self.stage = None
+        self.levels = None
+        self.runs = 0
+        self.speed = 1.0
+        self.sources = {}
+        self.game_scene = None if self.staged else GameScene(replay=replay, session=session)
+        self.curtain = Curtain(self)
+        self.start_scene = StartScene(self.curtain)
         self.main_widget = QWidget()
-        self.graph_view = QGraphicsView(self.main_widget)
-        self.mask_view = QGraphicsView(self.main_widget)
+        self.graph_view = GameView(self.main_widget)
         self.init()
 
     def init(self):
         self.setWindowTitle('QTank')
         self.resize(content_width + 20, content_height + 20)
-        self.game_scene.setSceneRect(0, 0, content_width, content_height)
+        self.graph_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.graph_view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.graph_view.setGeometry(QRect(5, 5, content_width + 5, content_height + 5))
         self.graph_view.setScene(self.start_scene)
-
-        self.mask_view.setSceneRect(0, 0, content_width, content_height)
-        self.mask_view.setGeometry(QRect(5, 5, content_width + 5, content_height + 5))
-        self.mask_view.setStyleSheet('background: transparent')
-        self.mask_view.setScene(self.mask_scene)
+        self.graph_view.overlay = self.curtain
         self.setCentralWidget(self.main_widget)
 
+    def set_speed(self, speed: float):
+        self.speed = speed
+        if self.game_scene is not None:
+            self.game_scene.loop.set_speed(speed)
+
+    def attach(self, slot: int, source):
+        self.sources[slot] = source
+        if self.game_scene is not None:
+            self.game_scene.controls.attach(slot, source)
+
+    def open_levels(self, path: str):
+        self.levels = LevelPack(path)
+
+    def prefetch_stage(self, number: int, players: int):
+        if self.staged:
+            level = self.levels[(number - 1) % len(self.levels)] if self.levels else None
+            self.stage = Stage(number, players, level=level).prefetch()
+
+    def stage_ready(self):
+        return self.stage is None or self.stage.ready()
+
+    def prepare_game_scene(self):
+        if self.stage is None:
+            return
+        stage = self.stage.result()
+        self.stage = None
+        self.stop()
+        self.game_scene = GameScene(stage=stage, on_finish=self.finish_stage)
+        self.game_scene.loop.set_speed(self.speed)
+        for slot, source in self.sources.items():
+            self.game_scene.controls.attach(slot, source)
+
+    def finish_stage(self, winner: str):
+        if winner != 'players':
+            self.curtain.reset_stage()
+        self.curtain.next_stage()
+        self.curtain.start_animation(self.curtain.selected)
+
+    def stop(self):
+        if self.game_scene is not None:
+            self.game_scene.stop()
+
     def enter_game_scene(self):
         self.graph_view.setScene(self.game_scene)
+        self.game_scene.follow()
 
     def start_game(self, players: int):
         self.game_scene.start(players)
+        if self.record_path:
+            self.game_scene.record(self.stage_path(self.record_path))
+
+    def stage_path(self, path: str):
+        if not self.staged:
+            return path
+        self.runs += 1
+        root, ext = os.path.splitext(path)
+        return '%s-%d%s' % (root, self.runs, ext)
+
+
+def report_startup():
+    profiler.mark('first frame')
+    sys.stderr.write(profiler.startup_report(started) + '\n')
+    sys.stderr.flush()
 
 
 if __name__ == '__main__':
+    profiler.mark('imports')
     app = QApplication.instance()
     if app is None:
         app = QApplication(sys.argv)
-    window = MainWindow()
+    profiler.mark('application')
+    GameConfig.set_render_mode(os.environ.get('QTANK_RENDER', 'default'))
+    trace_path = os.environ.get('QTANK_TRACE')
+    if trace_path:
+        profiler.enable(tracing=True)
+        app.aboutToQuit.connect(lambda: profiler.dump_trace(trace_path))
+    replay_path = os.environ.get('QTANK_REPLAY')
+    host_port = os.environ.get('QTANK_HOST')
+    join_address = os.environ.get('QTANK_JOIN')
+    session = None
+    if host_port or join_address:
+        from src.net import Session, Transport, host, join
+    if host_port:
+        transport = Transport(int(host_port))
+        session = Session(host(transport), 0, transport)
+    elif join_address:
+        address, port = join_address.rsplit(':', 1)
+        transport = Transport(int(os.environ.get('QTANK_PORT', 0)), (address, int(port)))
+        session = Session(join(transport), 1, transport)
+    record_path = os.environ.get('QTANK_RECORD')
+    if record_path and session is not None:
+        sys.stderr.write('QTANK_RECORD is ignored: network matches cannot be recorded\n')
+        record_path = None
+    window = MainWindow(Replay.load(replay_path) if replay_path else None, record_path, session)
+    window.set_speed(float(os.environ.get('QTANK_SPEED', 1)))
+    levels_path = os.environ.get('QTANK_LEVELS')
+    if levels_path:
+        window.open_levels(levels_path)
+    gamepad_slot = os.environ.get('QTANK_GAMEPAD')
+    if gamepad_slot:
+        window.attach(int(gamepad_slot), Gamepad())
+    app.aboutToQuit.connect(window.stop)
+    profiler.mark('window')
+    if os.environ.get('QTANK_STARTUP'):
+        window.graph_view.on_first_frame = report_startup
     window.show()
     app.exec_()
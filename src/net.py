@@ -0,0 +1,290 @@
+import argparse
+import json
+import random
+import socket
+import struct
+import subprocess
+import sys
+import time
+from collections import deque
+
+from src.base import generate_map
+from src.config import GameConfig
+from src.controls import RandomBot
+from src.replay import apply, digest
+from src.snapshot import restore, snapshot
+from src.world import World, WorldEvent
+
+hello_packet = 1
+start_packet = 2
+input_packet = 3
+start_format = struct.Struct('<BIIHHHH')
+input_format = struct.Struct('<BIIB')
+max_inputs = 255
+max_rollback = 15
+input_delay = 2
+linger = 1.0
+
+
+class Transport(object):
+    def __init__(self, port: int, remote=None, latency=0.0, loss=0.0, seed=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('', port))
+        self.sock.setblocking(False)
+        self.remote = remote
+        self.latency = latency / 2000
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.outgoing = deque()
+        self.greeting = None
+        self.bytes_sent = 0
+        self.packets_sent = 0
+
+    def send(self, data: bytes):
+        if self.remote is None or self.loss and self.rng.random() < self.loss:
+            return
+        self.outgoing.append((time.perf_counter() + self.latency, data))
+        self.flush()
+
+    def flush(self):
+        now = time.perf_counter()
+        while self.outgoing and self.outgoing[0][0] <= now:
+            data = self.outgoing.popleft()[1]
+            self.sock.sendto(data, self.remote)
+            self.bytes_sent += len(data)
+            self.packets_sent += 1
+
+    def receive(self):
+        self.flush()
+        while True:
+            try:
+                data, address = self.sock.recvfrom(2048)
+            except (BlockingIOError, ConnectionResetError):
+                return
+            if self.remote is None:
+                self.remote = address
+            yield data
+
+    def close(self):
+        self.sock.close()
+
+
+def host(transport: Transport, enemies=GameConfig.enemies, seed=None, timeout=30.0):
+    seed = random.getrandbits(32) if seed is None else seed
+    world = World(seed=seed)
+    world.populate(2, enemies)
+    start = start_format.pack(start_packet, world.terrain_map.seed, world.seed, world.columns, world.rows, enemies,
+                              world.ai_ticks)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if any(data[0] == hello_packet for data in transport.receive()):
+            transport.greeting = start
+            transport.send(start)
+            return world
+        time.sleep(0.01)
+    raise TimeoutError('no player joined within %.0f s' % timeout)
+
+
+def join(transport: Transport, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        transport.send(bytes([hello_packet]))
+        for data in transport.receive():
+            if data[0] == start_packet:
+                _, map_seed, seed, columns, rows, enemies, ai_ticks = start_format.unpack_from(data)
+                world = World(generate_map(columns, rows, map_seed), seed)
+                world.ai_ticks = ai_ticks
+                world.populate(2, enemies)
+                return world
+        time.sleep(0.05)
+    raise TimeoutError('no host answered within %.0f s' % timeout)
+
+
+class Session(object):
+    def __init__(self, world: World, slot: int, transport: Transport, delay=input_delay):
+        self.world = world
+        self.slot = slot
+        self.other = 1 - slot
+        self.transport = transport
+        self.inputs = ({}, {})
+        self.local_tick = delay
+        self.remote_tick = 0
+        self.acked = 0
+        self.snapshots = {}
+        self.predicted = {}
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.stalls = 0
+        for tick in range(delay):
+            self.inputs[slot][tick] = 0
+            self.inputs[self.other][tick] = 0
+        self.remote_tick = delay
+
+    def send(self):
+        first = self.acked
+        local = self.inputs[self.slot]
+        commands = bytes(local[tick] for tick in range(first, min(self.local_tick, first + max_inputs)))
+        self.transport.send(input_format.pack(input_packet, first, self.remote_tick, len(commands)) + commands)
+
+    def poll(self):
+        rollback = None
+        remote = self.inputs[self.other]
+        for data in self.transport.receive():
+            if data[0] == hello_packet and self.transport.greeting is not None:
+                self.transport.send(self.transport.greeting)
+            if data[0] != input_packet:
+                continue
+            _, first, ack, count = input_format.unpack_from(data)
+            self.acked = max(self.acked, ack)
+            for k in range(self.remote_tick - first, count):
+                if k < 0:
+                    break
+                tick = first + k
+                remote[tick] = data[input_format.size + k]
+                self.remote_tick = tick + 1
+                predicted = self.predicted.pop(tick, None)
+                if predicted is not None and predicted != remote[tick] and (rollback is None or tick < rollback):
+                    rollback = tick
+        return rollback
+
+    def simulate(self, changed=None):
+        world = self.world
+        tick = world.tick
+        self.snapshots[tick] = snapshot(world)
+        commands = bytearray(2)
+        commands[self.slot] = self.inputs[self.slot][tick]
+        remote = self.inputs[self.other].get(tick)
+        if remote is None:
+            remote = self.inputs[self.other].get(self.remote_tick - 1, 0)
+            self.predicted[tick] = remote
+        commands[self.other] = remote
+        apply(world, commands)
+        world.step()
+        if changed is not None:
+            for event, target in world.pop_events():
+                if event == WorldEvent.TERRAIN_DESTROYED:
+                    changed.add(target[:2])
+
+    def rollback(self, tick: int):
+        self.rollbacks += 1
+        end = self.world.tick
+        changed = set(restore(self.world, self.snapshots[tick]))
+        for key in [k for k in self.predicted if k >= tick]:
+            del self.predicted[key]
+        while self.world.tick < end:
+            self.simulate(changed)
+            self.resimulated += 1
+        return changed
+
+    def advance(self, local_command: int):
+        rollback = self.poll()
+        changed = self.rollback(rollback) if rollback is not None else None
+        if self.world.tick - self.remote_tick >= max_rollback:
+            self.stalls += 1
+            self.send()
+            return changed, False
+        self.inputs[self.slot][self.local_tick] = local_command
+        self.local_tick += 1
+        self.simulate(changed)
+        self.send()
+        self.prune()
+        return changed, True
+
+    def winner(self):
+        return self.world.winner if not self.predicted else None
+
+    def prune(self):
+        for tick in [k for k in self.snapshots if k < self.remote_tick - 1]:
+            del self.snapshots[tick]
+        oldest = min(self.acked, self.remote_tick - 1, self.world.tick)
+        for inputs in self.inputs:
+            for tick in [k for k in inputs if k < oldest]:
+                del inputs[tick]
+
+    def settle(self):
+        rollback = self.poll()
+        if rollback is not None:
+            self.rollback(rollback)
+        self.send()
+
+    def stats(self):
+        return {'rollbacks': self.rollbacks, 'resimulated': self.resimulated, 'stalls': self.stalls,
+                'bytes_sent': self.transport.bytes_sent, 'packets_sent': self.transport.packets_sent}
+
+
+def play(session: Session, ticks: int, tick_rate: float):
+    world = session.world
+    bot = RandomBot(session.slot)
+    interval = 1 / tick_rate
+    next_time = time.perf_counter()
+    while world.tick < ticks:
+        now = time.perf_counter()
+        if now < next_time:
+            time.sleep(min(next_time - now, interval))
+            continue
+        next_time += interval
+        session.advance(bot.sample())
+    done = None
+    while done is None or time.perf_counter() < done + linger:
+        session.settle()
+        if done is None and session.remote_tick >= ticks:
+            done = time.perf_counter()
+        time.sleep(interval / 2)
+
+
+def peer(args):
+    remote = None
+    if args.peer:
+        address, port = args.peer.rsplit(':', 1)
+        remote = (address, int(port))
+    transport = Transport(args.port, remote, args.latency, args.loss, args.port)
+    if args.role == 'host':
+        world = host(transport, args.enemies, args.seed)
+        slot = 0
+    else:
+        world = join(transport)
+        slot = 1
+    session = Session(world, slot, transport, args.delay)
+    play(session, args.ticks, GameConfig.tick_rate())
+    snapshot_tick = world.tick
+    result = {'slot': slot, 'tick': snapshot_tick, 'state': digest(world)}
+    result.update(session.stats())
+    transport.close()
+    print(json.dumps(result))
+
+
+def test(args):
+    command_line = [sys.executable, '-m', 'src.net', '--ticks', str(args.ticks), '--latency', str(args.latency),
+                    '--loss', str(args.loss), '--delay', str(args.delay), '--enemies', str(args.enemies)]
+    host_process = subprocess.Popen(command_line + ['host', '--port', str(args.port), '--seed', str(args.seed or 0)],
+                                    stdout=subprocess.PIPE)
+    join_process = subprocess.Popen(command_line + ['join', '--port', str(args.port + 1),
+                                                    '--peer', '127.0.0.1:%d' % args.port], stdout=subprocess.PIPE)
+    results = [json.loads(process.communicate()[0].decode().strip().splitlines()[-1])
+               for process in (host_process, join_process)]
+    for result in results:
+        print(json.dumps(result))
+    same = results[0]['state'] == results[1]['state'] and results[0]['tick'] == results[1]['tick']
+    print('in sync' if same else 'DESYNC')
+    return 0 if same else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Two-player rollback play over UDP.')
+    parser.add_argument('role', choices=('host', 'join', 'test'))
+    parser.add_argument('--port', type=int, default=47800)
+    parser.add_argument('--peer', help='host:port of the other player (join only)')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--enemies', type=int, default=GameConfig.enemies)
+    parser.add_argument('--ticks', type=int, default=1500)
+    parser.add_argument('--delay', type=int, default=input_delay, help='local input delay in ticks')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated round trip time in ms')
+    parser.add_argument('--loss', type=float, default=0.0, help='simulated packet loss ratio')
+    args = parser.parse_args(argv)
+    if args.role == 'test':
+        sys.exit(test(args))
+    peer(args)
+
+
+if __name__ == '__main__':
+    main()
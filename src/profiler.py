@@ -0,0 +1,127 @@
+import json
+import time
+from collections import deque
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Phase(object):
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler(object):
+    null_phase = _NullPhase()
+
+    def __init__(self, history=120):
+        self.enabled = False
+        self.tracing = False
+        self.frames = deque(maxlen=history)
+        self.phases = {}
+        self.counts = {}
+        self.events = []
+        self.marks = []
+        self.frame_start = None
+        self.epoch = time.perf_counter()
+
+    def enable(self, tracing=False):
+        self.enabled = True
+        self.tracing = tracing or self.tracing
+
+    def disable(self):
+        self.enabled = False
+        self.tracing = False
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return self.null_phase
+        return _Phase(self, name)
+
+    def record(self, name: str, start: float, end: float):
+        self.phases[name] = self.phases.get(name, 0.0) + (end - start) * 1000
+        if self.tracing:
+            self.events.append({'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                                'ts': (start - self.epoch) * 1e6, 'dur': (end - start) * 1e6})
+
+    def count(self, name: str, n=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def mark(self, name: str):
+        self.marks.append((name, time.perf_counter()))
+
+    def startup_report(self, start: float):
+        lines = []
+        last = start
+        for name, moment in self.marks:
+            lines.append('%-12s %7.1f ms  +%.1f ms' % (name, (moment - start) * 1000, (moment - last) * 1000))
+            last = moment
+        return '\n'.join(lines)
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        end = time.perf_counter()
+        frame = {'frame_ms': (end - self.frame_start) * 1000, 'phases': self.phases, 'counts': self.counts}
+        self.frames.append(frame)
+        if self.tracing:
+            self.events.append({'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                                'ts': (self.frame_start - self.epoch) * 1e6, 'dur': (end - self.frame_start) * 1e6})
+            for name, value in self.counts.items():
+                self.events.append({'name': name, 'ph': 'C', 'pid': 0, 'tid': 0,
+                                    'ts': (end - self.epoch) * 1e6, 'args': {name: value}})
+        self.phases = {}
+        self.counts = {}
+        self.frame_start = None
+
+    def summary(self):
+        if not self.frames:
+            return {'frames': 0, 'frame_ms': 0.0, 'phases': {}, 'counts': {}}
+        n = len(self.frames)
+        phases = {}
+        counts = {}
+        for frame in self.frames:
+            for name, value in frame['phases'].items():
+                phases[name] = phases.get(name, 0.0) + value / n
+            for name, value in frame['counts'].items():
+                counts[name] = counts.get(name, 0) + value / n
+        return {'frames': n, 'frame_ms': sum(f['frame_ms'] for f in self.frames) / n,
+                'phases': phases, 'counts': counts}
+
+    def report(self):
+        summary = self.summary()
+        lines = ['frame %.2f ms (%d frames)' % (summary['frame_ms'], summary['frames'])]
+        for name, value in sorted(summary['phases'].items()):
+            lines.append('%-10s %6.3f ms' % (name, value))
+        for name, value in sorted(summary['counts'].items()):
+            lines.append('%-15s %6.1f' % (name, value))
+        return '\n'.join(lines)
+
+    def dump_trace(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+profiler = Profiler()
@@ -0,0 +1,169 @@
+import argparse
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from src.base import Direction, generate_map
+from src.world import World
+
+magic = b'QTRP'
+version = 1
+header_format = struct.Struct('<4sBIIHHBHH')
+run_format = struct.Struct('<H')
+max_run = 0xffff
+fire_bit = 0x08
+directions = list(Direction)
+
+
+def command(direction=None, fire=False):
+    return (directions.index(direction) + 1 if direction is not None else 0) | (fire_bit if fire else 0)
+
+
+def encode(world: World):
+    commands = bytearray(len(world.roster))
+    for k, tank in enumerate(world.roster):
+        commands[k] = command(tank.directions[-1] if tank.directions else None, tank in world.firing)
+    return bytes(commands)
+
+
+def apply(world: World, commands: bytes):
+    for tank, command in zip(world.roster, commands):
+        direction = command & 0x07
+        tank.directions = [directions[direction - 1]] if direction else []
+        if command & fire_bit:
+            world.fire(tank)
+
+
+def digest(world: World):
+    state = bytearray(world.terrain_map.cells)
+    for tank in world.tanks():
+        state += struct.pack('<ffB', tank.x, tank.y, directions.index(tank.direction))
+    for ammo in world.ammos:
+        state += struct.pack('<ff', ammo.x, ammo.y)
+    return '%08x' % zlib.crc32(bytes(state))
+
+
+class Recorder(object):
+    def __init__(self, path: str, world: World, flush_size=4096):
+        self.path = path
+        self.players = len(world.roster)
+        self.flush_size = flush_size
+        self.commands = None
+        self.count = 0
+        self.ticks = 0
+        self.buffer = bytearray(header_format.pack(
+            magic, version, world.terrain_map.seed, world.seed, world.columns, world.rows,
+            self.players, len(world.enemies), world.ai_ticks))
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write, daemon=True)
+        self.writer.start()
+
+    def write(self):
+        with open(self.path, 'wb') as f:
+            while True:
+                chunk = self.queue.get()
+                if chunk is None:
+                    return
+                f.write(chunk)
+
+    def record(self, world: World):
+        commands = encode(world)
+        self.ticks += 1
+        if commands == self.commands and self.count < max_run:
+            self.count += 1
+            return
+        self.end_run()
+        self.commands = commands
+        self.count = 1
+
+    def end_run(self):
+        if self.count:
+            self.buffer += run_format.pack(self.count)
+            self.buffer += self.commands
+            if len(self.buffer) >= self.flush_size:
+                self.queue.put(bytes(self.buffer))
+                self.buffer = bytearray()
+
+    def close(self):
+        self.end_run()
+        self.count = 0
+        self.queue.put(bytes(self.buffer))
+        self.queue.put(None)
+        self.writer.join()
+
+
+class Replay(object):
+    def __init__(self, map_seed: int, seed: int, columns: int, rows: int, players: int, enemies: int,
+                 ai_ticks: int, runs):
+        self.map_seed = map_seed
+        self.seed = seed
+        self.columns = columns
+        self.rows = rows
+        self.players = players
+        self.enemies = enemies
+        self.ai_ticks = ai_ticks
+        self.runs = runs
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < header_format.size:
+            raise ValueError('%s is not a version %d replay' % (path, version))
+        fields = header_format.unpack_from(data)
+        if fields[0] != magic or fields[1] != version:
+            raise ValueError('%s is not a version %d replay' % (path, version))
+        players = fields[6]
+        runs = []
+        offset = header_format.size
+        while offset < len(data):
+            if offset + run_format.size + players > len(data):
+                raise ValueError('%s is truncated after %d runs' % (path, len(runs)))
+            count, = run_format.unpack_from(data, offset)
+            offset += run_format.size
+            runs.append((count, data[offset:offset + players]))
+            offset += players
+        return cls(*fields[2:], runs)
+
+    def ticks(self):
+        return sum(count for count, _ in self.runs)
+
+    def world(self):
+        world = World(generate_map(self.columns, self.rows, self.map_seed), self.seed)
+        world.ai_ticks = self.ai_ticks
+        return world
+
+    def commands(self):
+        for count, commands in self.runs:
+            for _ in range(count):
+                yield commands
+
+    def play(self, world=None):
+        if world is None:
+            world = self.world()
+            world.populate(self.players, self.enemies)
+        for commands in self.commands():
+            apply(world, commands)
+            world.step()
+            world.pop_events()
+        return world
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-simulate a recorded match headless at full speed.')
+    parser.add_argument('path')
+    args = parser.parse_args(argv)
+    replay = Replay.load(args.path)
+    start = time.perf_counter()
+    world = replay.play()
+    elapsed = time.perf_counter() - start
+    ticks = replay.ticks()
+    print('%d ticks in %.3f s (%.0f ticks/s), state %s' % (ticks, elapsed, ticks / elapsed if elapsed else 0,
+                                                          digest(world)))
+    return world
+
+
+if __name__ == '__main__':
+    main()
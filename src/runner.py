@@ -0,0 +1,121 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from src.base import TankType, generate_map
+from src.config import GameConfig
+from src.controls import AimBot, Controls
+from src.replay import apply
+from src.world import World, WorldEvent, tank_stats
+
+
+def parse_override(text: str):
+    try:
+        target, value = text.split('=')
+        name, stat = target.split('.')
+        tank_type = TankType[name.upper()]
+        value = int(value)
+    except (ValueError, KeyError):
+        raise argparse.ArgumentTypeError('expected TANK.stat=value, got %r' % text)
+    if stat not in tank_stats:
+        raise argparse.ArgumentTypeError('unknown stat %r, expected one of %s' % (stat, ', '.join(tank_stats)))
+    return tank_type.name, stat, value
+
+
+def play_match(job):
+    start = time.perf_counter()
+    overrides = {}
+    for name, stat, value in job['overrides']:
+        overrides.setdefault(TankType[name], {})[stat] = value
+    world = World(generate_map(job['columns'], job['rows'], job['seed']), job['seed'])
+    world.overrides = overrides
+    world.populate(job['players'], job['enemies'])
+    controls = Controls([AimBot(job['seed'] + slot) for slot in range(job['players'])])
+    kills = {'players': 0, 'enemies': 0}
+    while world.winner is None and world.tick < job['ticks']:
+        apply(world, controls.sample(world))
+        world.step()
+        for event, target in world.pop_events():
+            if event == WorldEvent.TANK_DESTROYED:
+                kills['enemies' if target.is_player else 'players'] += 1
+    return {
+        'match': job['match'],
+        'seed': job['seed'],
+        'winner': world.winner or 'draw',
+        'ticks': world.tick,
+        'duration_s': world.tick * GameConfig.interval / 1000,
+        'shots': world.shots,
+        'kills': kills,
+        'wall_ms': (time.perf_counter() - start) * 1000,
+    }
+
+
+def jobs(args):
+    seeds = random.Random(args.seed)
+    for match in range(args.matches):
+        yield {
+            'match': match,
+            'seed': seeds.getrandbits(32),
+            'columns': args.columns,
+            'rows': args.rows,
+            'players': args.players,
+            'enemies': args.enemies,
+            'ticks': args.ticks,
+            'overrides': args.set,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play headless matches in parallel and stream results as JSON lines.')
+    parser.add_argument('--matches', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ticks', type=int, default=3 * 60 * int(GameConfig.tick_rate()),
+                        help='ticks before a match is called a draw')
+    parser.add_argument('--players', type=int, choices=(1, 2), default=1)
+    parser.add_argument('--enemies', type=int, default=GameConfig.enemies)
+    parser.add_argument('--columns', type=int, default=GameConfig.columns)
+    parser.add_argument('--rows', type=int, default=GameConfig.rows)
+    parser.add_argument('--set', type=parse_override, action='append', default=[], metavar='TANK.stat=value',
+                        help='override a tank stat, e.g. ENEMY_1.hit_point=20 (repeatable)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    wins = {'players': 0, 'enemies': 0, 'draw': 0}
+    ticks = 0
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers)
+        results = pool.imap_unordered(play_match, jobs(args))
+    else:
+        pool = None
+        results = map(play_match, jobs(args))
+    try:
+        for result in results:
+            wins[result['winner']] += 1
+            ticks += result['ticks']
+            sys.stdout.write(json.dumps(result) + '\n')
+            sys.stdout.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start
+    summary = {
+        'summary': True,
+        'matches': args.matches,
+        'overrides': ['%s.%s=%d' % override for override in args.set],
+        'win_rate': {side: count / args.matches for side, count in wins.items()} if args.matches else {},
+        'mean_ticks': ticks / args.matches if args.matches else 0,
+        'wall_s': elapsed,
+        'matches_per_s': args.matches / elapsed if elapsed else 0,
+    }
+    sys.stdout.write(json.dumps(summary) + '\n')
+    return summary
+
+
+if __name__ == '__main__':
+    main()
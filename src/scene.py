@@ -1,115 +1,147 @@
-from PySide2.QtCore import QTimer, Qt
-from PySide2.QtGui import QPixmap, QKeyEvent, QBrush, QFont, QPen
-from PySide2.QtWidgets import QGraphicsScene, QGraphicsTextItem, QGraphicsRectItem, QGraphicsPixmapItem
+import math
+import os
+import random
+
+from PySide2.QtCore import QRectF, QTimer, Qt
+from PySide2.QtGui import QKeyEvent, QBrush, QFont, QPainter
+from PySide2.QtWidgets import QGraphicsScene, QGraphicsTextItem, QGraphicsPixmapItem, QGraphicsSimpleTextItem
 
 from src.config import GameConfig
-from src.base import Direction, TankType, TerrainType, generate_random_map
-from src.item import TankItem, EnemyItem, TerrainItem
+from src.controls import Controls, Keyboard, fire
+from src.base import Direction, Tank, TankType, TerrainMap
+from src.item import TankItem, TerrainLayerItem, AmmoItemPool, grass_terrains, ground_terrains
+from src.loop import GameLoop
+from src.profiler import profiler
+from src.replay import Recorder, apply
+from src.snapshot import restore, snapshot
+from src.sprite import sprites
+from src.world import World, WorldEvent
 
-columns = GameConfig.columns
-rows = GameConfig.rows
 cube_size = GameConfig.cube_size
-content_width = GameConfig.width()
-content_height = GameConfig.height()
+chunk_size = GameConfig.chunk_size
+content_width = GameConfig.view_width()
+content_height = GameConfig.view_height()
 interval = GameConfig.interval
-
-
-class MaskScene(QGraphicsScene):
+release_radius = GameConfig.release_radius
+save_path = 'quicksave.qts'
+settle_time = 1000
+key_bindings = {
+    Qt.Key_W: (0, Direction.UP),
+    Qt.Key_S: (0, Direction.DOWN),
+    Qt.Key_A: (0, Direction.LEFT),
+    Qt.Key_D: (0, Direction.RIGHT),
+    Qt.Key_J: (0, fire),
+    Qt.Key_Up: (1, Direction.UP),
+    Qt.Key_Down: (1, Direction.DOWN),
+    Qt.Key_Left: (1, Direction.LEFT),
+    Qt.Key_Right: (1, Direction.RIGHT),
+    Qt.Key_Slash: (1, fire),
+}
+
+
+def camera_rect(world: World):
+    players = world.players
+    if players:
+        x = sum(p.x for p in players) / len(players) + cube_size / 2
+        y = sum(p.y for p in players) / len(players) + cube_size / 2
+    else:
+        x, y = world.width / 2, world.height
+    width, height = content_width, content_height
+    left = min(max(x - width / 2, 0), max(world.width - width, 0))
+    top = min(max(y - height / 2, 0), max(world.height - height, 0))
+    return left, top, width, height
+
+
+def camera_chunk(rect):
+    left, top = rect[:2]
+    return int(top // (chunk_size * cube_size)), int(left // (chunk_size * cube_size))
+
+
+class Curtain(object):
     _stage_text = 'STAGE %s'
+    speed = 10
+    hold_ticks = 800 // interval
 
     def __init__(self, main_window, stage=1):
-        super().__init__()
         self.main_window = main_window
         self.stage = stage
-        self.upper_mask = QGraphicsRectItem(0, 0, content_width, 0)
-        self.lower_mask = QGraphicsRectItem(0, content_height, content_width, 0)
-        self.stage_text_item = QGraphicsTextItem()
-        self.mask_height = 0
-        self.animation_timer_1 = QTimer()
-        self.animation_timer_2 = QTimer()
-        self.animation_timer_3 = QTimer()
+        self.height = 0
+        self.phase = None
+        self.hold = 0
         self.selected = None
-        self.init()
-
-    def init(self):
-        mask_brush = QBrush()
-        mask_brush.setColor(Qt.gray)
-        mask_brush.setStyle(Qt.SolidPattern)
-        mask_pen = QPen()
-        mask_pen.setColor(Qt.gray)
-        self.upper_mask.setBrush(mask_brush)
-        self.lower_mask.setBrush(mask_brush)
-        self.upper_mask.setPen(mask_pen)
-        self.lower_mask.setPen(mask_pen)
-        self.addItem(self.upper_mask)
-        self.addItem(self.lower_mask)
-
-        font = QFont()
-        font.setPointSize(20)
-        font.setBold(True)
-        self.stage_text_item.setPlainText(self._stage_text % self.stage)
-        self.stage_text_item.setFont(font)
-        self.stage_text_item.setDefaultTextColor(Qt.black)
-        self.stage_text_item.setX(content_width / 2 - int(self.stage_text_item.boundingRect().width() / 2))
-        self.stage_text_item.setY(content_height / 2 - int(self.stage_text_item.boundingRect().height() / 2))
-
-        self.animation_timer_1.setInterval(interval)
-        self.animation_timer_1.timeout.connect(self.animation_in)
-
-        self.animation_timer_2.setSingleShot(True)
-        self.animation_timer_2.timeout.connect(self.animation_hold)
-        self.animation_timer_2.setInterval(800)
-
-        self.animation_timer_3.setInterval(interval)
-        self.animation_timer_3.timeout.connect(self.animation_out)
+        self.brush = QBrush(Qt.gray)
+        self.font = QFont()
+        self.font.setPointSize(20)
+        self.font.setBold(True)
+        self.loop = GameLoop(self.step)
 
     def next_stage(self):
         self.stage += 1
-        self.stage_text_item.setPlainText(self._stage_text % self.stage)
 
     def reset_stage(self):
         self.stage = 0
-        self.stage_text_item.setPlainText(self._stage_text % self.stage)
-
-    def animation_in(self):
-        self.mask_height += 10
-        finished = False
-        if self.mask_height > content_height / 2:
-            self.mask_height = content_height / 2
-            finished = True
-        self.upper_mask.setRect(0, 0, content_width, self.mask_height)
-        self.lower_mask.setRect(0, content_height - self.mask_height, content_width, self.mask_height)
-        if finished:
-            self.addItem(self.stage_text_item)
-            self.animation_timer_1.stop()
-            self.animation_timer_2.start()
-
-    def animation_out(self):
-        self.mask_height -= 10
-        finished = False
-        if self.mask_height < 0:
-            self.mask_height = 0
-            finished = True
-        self.upper_mask.setRect(0, 0, content_width, self.mask_height)
-        self.lower_mask.setRect(0, content_height - self.mask_height, content_width, self.mask_height)
-        if finished:
-            self.animation_timer_3.stop()
-            self.main_window.start_game(self.selected)
-
-    def animation_hold(self):
-        self.removeItem(self.stage_text_item)
-        self.animation_timer_3.start()
-        self.main_window.enter_game_scene()
+
+    def active(self):
+        return self.phase is not None
 
     def start_animation(self, selected: int):
-        self.animation_timer_1.start()
         self.selected = selected
+        self.main_window.prefetch_stage(self.stage, selected + 1)
+        self.phase = 'in'
+        self.loop.start()
+
+    def viewport(self):
+        return self.main_window.graph_view.viewport()
+
+    def step(self):
+        old = self.height
+        if self.phase == 'in':
+            half = self.viewport().height() / 2
+            self.height = min(self.height + self.speed, half)
+            if self.height >= half and self.main_window.stage_ready():
+                self.phase = 'hold'
+                self.hold = self.hold_ticks
+                self.invalidate_text()
+                self.main_window.prepare_game_scene()
+        elif self.phase == 'hold':
+            self.hold -= 1
+            if self.hold <= 0:
+                self.phase = 'out'
+                self.invalidate_text()
+                self.main_window.enter_game_scene()
+        elif self.phase == 'out':
+            self.height = max(self.height - self.speed, 0)
+            if self.height <= 0:
+                self.phase = None
+                self.loop.stop()
+                self.main_window.start_game(self.selected + 1)
+        self.invalidate(old)
+
+    def invalidate(self, old: float):
+        low, high = int(min(old, self.height)), int(math.ceil(max(old, self.height)))
+        if high > low:
+            viewport = self.viewport()
+            viewport.update(0, low, viewport.width(), high - low)
+            viewport.update(0, viewport.height() - high, viewport.width(), high - low)
+
+    def invalidate_text(self):
+        viewport = self.viewport()
+        viewport.update(0, viewport.height() // 2 - cube_size // 2, viewport.width(), cube_size)
+
+    def paint(self, painter: QPainter, width: int, height: int):
+        if self.height > 0:
+            painter.fillRect(QRectF(0, 0, width, self.height), self.brush)
+            painter.fillRect(QRectF(0, height - self.height, width, self.height), self.brush)
+        if self.phase == 'hold':
+            painter.setFont(self.font)
+            painter.setPen(Qt.black)
+            painter.drawText(QRectF(0, 0, width, height), int(Qt.AlignCenter), self._stage_text % self.stage)
 
 
 class StartScene(QGraphicsScene):
-    def __init__(self, mask_scene, stage=1):
+    def __init__(self, curtain, stage=1):
         super().__init__()
-        self.mask_scene = mask_scene
+        self.curtain = curtain
         self.y_list = [300, 400]
         self.selected = 0
         self.stage = stage
@@ -142,12 +174,8 @@ class StartScene(QGraphicsScene):
         self.addItem(self.one_play_text_item)
         self.addItem(self.two_plays_text_item)
 
-        png = QPixmap()
-        png.load('../images/%s' % TankType.PLAYER_ONE.pic)
-        png = png.scaled(25, 25)
-        self.indicator_item = QGraphicsPixmapItem(png)
-        self.indicator_item.setRotation(90)
-        self.indicator_item.setX(260)
+        self.indicator_item = QGraphicsPixmapItem(sprites.get(TankType.PLAYER_ONE.pic, 25, rotation=90))
+        self.indicator_item.setX(235)
         self.indicator_item.setY(self.y_list[self.selected] + 8)
         self.addItem(self.indicator_item)
 
@@ -165,121 +193,251 @@ class StartScene(QGraphicsScene):
         if event.key() == Qt.Key_Space:
             if not self.start:
                 self.start = True
-                self.mask_scene.start_animation(self.selected)
+                self.curtain.start_animation(self.selected)
 
 
 class GameScene(QGraphicsScene):
-    def __init__(self, stage=1):
+    def __init__(self, stage=None, replay=None, session=None, on_finish=None):
         super().__init__()
-        self.stage = stage
+        self.staged = stage is not None
+        self.on_finish = on_finish
+        self.replay = replay
+        self.session = session
+        self.keyboard = Keyboard(key_bindings)
+        self.controls = Controls(self.keyboard.players)
+        self.commands = None
+        self.recorder = None
         self.started = False
-        self.tank1 = TankItem(TankType.PLAYER_ONE, Direction.UP)
-        self.tank2 = TankItem(TankType.PLAYER_TWO, Direction.UP)
-        self.enemies = []
-        self.terrain_map = generate_random_map(columns, rows)
-        self.draw_terrain(self.terrain_map)
+        self.tank_items = []
+        self.ammo_pool = AmmoItemPool(self)
+        self.ground_layers = {}
+        self.grass_layers = {}
+        self.view_rect = (0, 0, content_width, content_height)
+        self.camera_chunk = None
+        self.profiler_item = QGraphicsSimpleTextItem()
+        self.loop = GameLoop(self.tick)
+        self.settle_timer = QTimer()
+        if session is not None:
+            self.settle_timer.timeout.connect(session.settle)
+            self.world = session.world
+        elif replay is not None:
+            self.world = replay.world()
+        elif stage is not None:
+            self.world = stage.world
+        else:
+            self.world = World(seed=random.getrandbits(32))
+        self.terrain_map = self.world.terrain_map
+        self.setSceneRect(0, 0, self.world.width, self.world.height)
+        if GameConfig.scene_index == 'none':
+            self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        else:
+            self.setBspTreeDepth(GameConfig.bsp_depth)
+        self.draw_terrain(self.terrain_map, stage)
         brush = QBrush()
         brush.setColor(Qt.black)
         brush.setStyle(Qt.SolidPattern)
         self.setBackgroundBrush(brush)
+        self.init_profiler()
+        self.follow()
+
+    def init_profiler(self):
+        font = QFont('monospace')
+        font.setPointSize(9)
+        font.setStyleHint(QFont.Monospace)
+        self.profiler_item.setFont(font)
+        self.profiler_item.setBrush(QBrush(Qt.white))
+        self.profiler_item.setZValue(100)
+        self.profiler_item.setVisible(profiler.enabled)
+        self.addItem(self.profiler_item)
+
+    def toggle_profiler(self):
+        if profiler.enabled:
+            profiler.disable()
+        else:
+            profiler.enable()
+        self.profiler_item.setVisible(profiler.enabled)
 
     def start(self, players):
         self.started = True
-        self.add_tank1(self.tank1)
-        if players > 1:
-            self.add_tank2(self.tank2)
-        self.add_enemy(EnemyItem(TankType.ENEMY_1), 0)
-        self.add_enemy(EnemyItem(TankType.ENEMY_2), 6)
-        self.add_enemy(EnemyItem(TankType.ENEMY_3), 12)
-
-    def add_tank1(self, tank: TankItem):
-        self.tank1 = tank
-        self.tank1.setX(4 * cube_size)
-        self.tank1.setY(content_height - cube_size)
-        self.addItem(tank)
-
-    def add_tank2(self, tank: TankItem):
-        self.tank2 = tank
-        self.tank2.setX(8 * cube_size)
-        self.tank2.setY(content_height - cube_size)
-        self.addItem(tank)
-
-    def add_enemy(self, enemy: EnemyItem, x_cell=0):
-        enemy.setX(x_cell * cube_size)
-        enemy.setY(0)
-        self.enemies.append(enemy)
-        self.addItem(enemy)
-
-    def draw_terrain(self, terrain_list: list):
-        size = int(cube_size / 2)
-        for r, line in enumerate(terrain_list):
-            for c, cell in enumerate(line):
-                png = QPixmap()
-                if cell.terrain == TerrainType.BRINK:
-                    png.load('../images/brink.png')
-                elif cell.terrain == TerrainType.STEEL:
-                    png.load('../images/steel.png')
-                elif cell.terrain == TerrainType.GRASS:
-                    png.load('../images/grass.png')
-                elif cell.terrain == TerrainType.WATER:
-                    png.load('../images/water.png')
-                else:
-                    continue
-                png = png.scaled(size, size)
-                for index, state in enumerate(cell.state):
-                    x = c * cube_size + index % 2 * size
-                    y = r * cube_size + index // 2 * size
-                    if state:
-                        item = TerrainItem(png, cell.terrain)
-                        if cell.terrain == TerrainType.GRASS:
-                            item.setZValue(10)
-                        item.setX(x)
-                        item.setY(y)
-                        self.addItem(item)
+        if self.replay is not None:
+            self.world.populate(self.replay.players, self.replay.enemies)
+            self.commands = self.replay.commands()
+        elif self.session is None and not self.staged:
+            self.world.ai_ticks = self.loop.ticks(GameConfig.ai_interval)
+            self.world.populate(players, GameConfig.enemies)
+        for tank in self.world.tanks():
+            self.add_tank(tank)
+        self.follow()
+        self.loop.start()
+
+    def record(self, path: str):
+        if self.session is not None:
+            raise ValueError('network matches cannot be recorded')
+        self.recorder = Recorder(path, self.world)
+
+    def stop(self):
+        self.loop.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def tick(self):
+        if self.session is not None:
+            self.net_tick()
+            return
+        if self.commands is not None:
+            commands = next(self.commands, None)
+            if commands is None:
+                self.stop()
+                return
+            apply(self.world, commands)
+        else:
+            apply(self.world, self.controls.sample(self.world))
+            if self.recorder is not None:
+                self.recorder.record(self.world)
+        self.world.step()
+        with profiler.phase('sync'):
+            self.follow()
+            self.sync()
+        if self.world.winner is not None:
+            self.finish(self.world.winner)
+        if profiler.enabled and self.loop.tick % 10 == 0:
+            self.profiler_item.setText(profiler.report())
+            self.profiler_item.setPos(self.view_rect[0] + 5, self.view_rect[1] + 5)
+
+    def net_tick(self):
+        changed, _ = self.session.advance(self.keyboard.players[0].sample())
+        if changed is not None:
+            self.rebuild(changed)
+        with profiler.phase('sync'):
+            self.follow()
+            self.sync()
+        winner = self.session.winner()
+        if winner is not None:
+            self.finish(winner)
+
+    def finish(self, winner: str):
+        self.stop()
+        if self.session is not None:
+            self.settle_timer.start(interval)
+            QTimer.singleShot(settle_time, self.settle_timer.stop)
+        if self.on_finish is not None:
+            self.on_finish(winner)
+
+    def follow(self):
+        self.view_rect = left, top, width, height = camera_rect(self.world)
+        for view in self.views():
+            view.centerOn(left + width / 2, top + height / 2)
+        chunk = camera_chunk(self.view_rect)
+        if chunk != self.camera_chunk:
+            self.camera_chunk = chunk
+            self.release_terrain(chunk)
+
+    def release_terrain(self, chunk):
+        for layers in (self.ground_layers, self.grass_layers):
+            for (i, j), layer in layers.items():
+                if (layer.pixmap is not None or layer.image is not None) and \
+                        (abs(i - chunk[0]) > release_radius or abs(j - chunk[1]) > release_radius):
+                    layer.release()
+
+    def sync(self):
+        for event, target in self.world.pop_events():
+            if event == WorldEvent.AMMO_ADDED:
+                self.ammo_pool.acquire(target)
+            elif event == WorldEvent.AMMO_REMOVED:
+                self.ammo_pool.release(target)
+            elif event == WorldEvent.TANK_DESTROYED:
+                if target.lives <= 0:
+                    self.remove_tank(target)
+            elif event == WorldEvent.TERRAIN_DESTROYED:
+                r, c, index = target
+                for layers in (self.ground_layers, self.grass_layers):
+                    layer = layers[(r // chunk_size, c // chunk_size)]
+                    if self.terrain_map.terrain(r, c) in layer.terrains:
+                        layer.clear(r, c, index)
+        for item in self.tank_items:
+            item.sync(self.view_rect)
+        self.ammo_pool.sync(self.view_rect)
+
+    def add_tank(self, tank: Tank):
+        item = TankItem(tank)
+        self.tank_items.append(item)
+        self.addItem(item)
+        self.ammo_pool.reserve(tank.max_storage)
+        return tank
+
+    def save(self, path=save_path):
+        with open(path, 'wb') as f:
+            f.write(snapshot(self.world))
+
+    def load(self, path=save_path):
+        with open(path, 'rb') as f:
+            self.restore(f.read())
+
+    def restore(self, data: bytes):
+        self.rebuild(restore(self.world, data))
+
+    def rebuild(self, changed):
+        tanks = self.world.players + self.world.enemies
+        for item in self.tank_items[len(tanks):]:
+            self.removeItem(item)
+        del self.tank_items[len(tanks):]
+        for item, tank in zip(self.tank_items, tanks):
+            item.bind(tank)
+        for tank in tanks[len(self.tank_items):]:
+            item = TankItem(tank)
+            self.tank_items.append(item)
+            self.addItem(item)
+        for ammo in list(self.ammo_pool.live):
+            self.ammo_pool.release(ammo)
+        for ammo in self.world.ammos:
+            self.ammo_pool.acquire(ammo)
+        for chunk in {(r // chunk_size, c // chunk_size) for r, c in changed}:
+            for layers in (self.ground_layers, self.grass_layers):
+                layers[chunk].release()
+                layers[chunk].update()
+        self.follow()
+        self.sync()
+
+    def remove_tank(self, tank: Tank):
+        for item in self.tank_items:
+            if item.tank is tank:
+                self.tank_items.remove(item)
+                self.removeItem(item)
+                return
+
+    def draw_terrain(self, terrain_map: TerrainMap, stage=None):
+        for i in range(0, terrain_map.rows, chunk_size):
+            for j in range(0, terrain_map.columns, chunk_size):
+                chunk = (i // chunk_size, j // chunk_size)
+                ground = TerrainLayerItem(terrain_map, ground_terrains, i, j, chunk_size, chunk_size,
+                                          stage.ground_images.pop(chunk, None) if stage is not None else None)
+                grass = TerrainLayerItem(terrain_map, grass_terrains, i, j, chunk_size, chunk_size,
+                                         stage.grass_images.pop(chunk, None) if stage is not None else None)
+                grass.setZValue(10)
+                self.ground_layers[chunk] = ground
+                self.grass_layers[chunk] = grass
+                self.addItem(ground)
+                self.addItem(grass)
 
     def keyPressEvent(self, event: QKeyEvent):
-        if self.started:
-            if self.tank1 is not None:
-                if event.key() == Qt.Key_W:
-                    self.tank1.directions.append(Direction.UP)
-                elif event.key() == Qt.Key_S:
-                    self.tank1.directions.append(Direction.DOWN)
-                elif event.key() == Qt.Key_A:
-                    self.tank1.directions.append(Direction.LEFT)
-                elif event.key() == Qt.Key_D:
-                    self.tank1.directions.append(Direction.RIGHT)
-                elif event.key() == Qt.Key_J:
-                    self.tank1.shoot()
-
-            if self.tank2 is not None:
-                if event.key() == Qt.Key_Up:
-                    self.tank2.directions.append(Direction.UP)
-                elif event.key() == Qt.Key_Down:
-                    self.tank2.directions.append(Direction.DOWN)
-                elif event.key() == Qt.Key_Left:
-                    self.tank2.directions.append(Direction.LEFT)
-                elif event.key() == Qt.Key_Right:
-                    self.tank2.directions.append(Direction.RIGHT)
-                elif event.key() == Qt.Key_Slash:
-                    self.tank2.shoot()
+        if event.key() == Qt.Key_F3:
+            self.toggle_profiler()
+        if not self.started or self.replay is not None:
+            return
+        if self.session is None:
+            if event.key() == Qt.Key_F5:
+                self.save()
+            elif event.key() == Qt.Key_F9 and os.path.exists(save_path):
+                self.load()
+        if event.isAutoRepeat() and key_bindings.get(event.key(), (None, None))[1] != fire:
+            return
+        self.keyboard.key(event.key(), True)
 
     def keyReleaseEvent(self, event: QKeyEvent):
-        if self.started:
-            if self.tank1 is not None:
-                if event.key() == Qt.Key_W:
-                    self.tank1.directions.remove(Direction.UP)
-                elif event.key() == Qt.Key_S:
-                    self.tank1.directions.remove(Direction.DOWN)
-                elif event.key() == Qt.Key_A:
-                    self.tank1.directions.remove(Direction.LEFT)
-                elif event.key() == Qt.Key_D:
-                    self.tank1.directions.remove(Direction.RIGHT)
-            if self.tank2 is not None:
-                if event.key() == Qt.Key_Up:
-                    self.tank2.directions.remove(Direction.UP)
-                elif event.key() == Qt.Key_Down:
-                    self.tank2.directions.remove(Direction.DOWN)
-                elif event.key() == Qt.Key_Left:
-                    self.tank2.directions.remove(Direction.LEFT)
-                elif event.key() == Qt.Key_Right:
-                    self.tank2.directions.remove(Direction.RIGHT)
+        if not event.isAutoRepeat():
+            self.keyboard.key(event.key(), False)
+
+    def focusOutEvent(self, event):
+        self.keyboard.clear()
+        super().focusOutEvent(event)
@@ -0,0 +1,200 @@
+import struct
+from collections import deque
+
+from src.base import Direction, Tank, TankType, TerrainMap, TerrainType
+from src.collision import SpatialHash
+from src.world import World, tank_stats
+
+magic = b'QTSN'
+version = 2
+header_format = struct.Struct('<4sBHHIIBBIIHHHHHHH')
+rng_format = struct.Struct('<625I')
+tank_format = struct.Struct('<BBiiiiiiiffBBHffff')
+ammo_format = struct.Struct('<HBff')
+override_format = struct.Struct('<BBi')
+alive_flag = 0x01
+firing_flag = 0x02
+last_flag = 0x04
+tank_types = list(TankType)
+directions = list(Direction)
+winners = [None, 'players', 'enemies']
+blank = TerrainType.BLANK.index
+
+
+def snapshot(world: World):
+    ai = world.ai
+    tanks = world.roster + [tank for tank in world.enemies if tank not in world.roster]
+    for ammo in world.ammos:
+        if ammo.tank not in tanks:
+            tanks.append(ammo.tank)
+    index = {tank: k for k, tank in enumerate(tanks)}
+    live = world.players + world.enemies
+    alive = set(live)
+    overrides = [(tank_types.index(tank_type), tank_stats.index(name), value)
+                 for tank_type, stats in world.overrides.items() for name, value in stats.items()]
+    chunks = [
+        header_format.pack(magic, version, world.columns, world.rows, world.tick, world.seed or 0,
+                           winners.index(world.winner), world.base is not None, world.shots['players'],
+                           world.shots['enemies'], world.ai_ticks, len(world.roster), len(world.players),
+                           len(world.enemies), len(tanks), len(world.ammos), len(overrides)),
+        rng_format.pack(*world.rng.getstate()[1]),
+        bytes(world.terrain_map.cells),
+        struct.pack('<%dH' % len(live), *[index[tank] for tank in live]),
+    ]
+    for tank in tanks:
+        last = ai.last.get(tank)
+        flags = (alive_flag if tank in alive else 0) | (firing_flag if tank in world.firing else 0) | \
+                (last_flag if last is not None else 0)
+        last = last or (0, 0)
+        spawn = world.spawns.get(tank, (tank.x, tank.y))
+        chunks.append(tank_format.pack(
+            tank_types.index(tank.tank_type), flags, tank.lives, tank.hit_point, tank.power, tank.max_storage,
+            tank.speed, tank.ammo_speed, tank.ammo_storage, tank.x, tank.y, directions.index(tank.direction),
+            directions.index(tank.directions[-1]) + 1 if tank.directions else 0, ai.wander.get(tank, 0),
+            last[0], last[1], spawn[0], spawn[1]))
+    for ammo in world.ammos:
+        chunks.append(ammo_format.pack(index[ammo.tank], directions.index(ammo.direction), ammo.x, ammo.y))
+    for override in overrides:
+        chunks.append(override_format.pack(*override))
+    return b''.join(chunks)
+
+
+def restore(world: World, data: bytes):
+    (name, number, columns, rows, tick, seed, winner, base, player_shots, enemy_shots, ai_ticks, roster, players,
+     enemies, tank_count, ammo_count, override_count) = header_format.unpack_from(data)
+    if name != magic or number != version:
+        raise ValueError('not a version %d snapshot' % version)
+    if (columns, rows) != (world.columns, world.rows):
+        raise ValueError('snapshot is %dx%d, world is %dx%d' % (columns, rows, world.columns, world.rows))
+    offset = header_format.size
+    world.rng.setstate((3, rng_format.unpack_from(data, offset), None))
+    offset += rng_format.size
+    changed = restore_terrain(world, data[offset:offset + columns * rows])
+    offset += columns * rows
+    live = struct.unpack_from('<%dH' % (players + enemies), data, offset)
+    offset += 2 * (players + enemies)
+
+    ai = world.ai
+    ai.tank_fields.clear()
+    ai.last.clear()
+    ai.wander.clear()
+    world.spawns.clear()
+    world.firing = []
+    tanks = []
+    for k in range(tank_count):
+        (kind, flags, lives, hit_point, power, max_storage, speed, ammo_speed, ammo_storage, x, y, direction, moving,
+         wander, last_x, last_y, spawn_x, spawn_y) = tank_format.unpack_from(data, offset)
+        offset += tank_format.size
+        tank = Tank(tank_types[kind], directions[direction])
+        tank.lives, tank.hit_point, tank.power = lives, hit_point, power
+        tank.max_storage, tank.speed, tank.ammo_speed, tank.ammo_storage = max_storage, speed, ammo_speed, ammo_storage
+        tank.x, tank.y = x, y
+        tank.directions = [directions[moving - 1]] if moving else []
+        world.spawns[tank] = (spawn_x, spawn_y)
+        if flags & firing_flag:
+            world.firing.append(tank)
+        if flags & last_flag:
+            ai.last[tank] = (last_x, last_y)
+        if wander:
+            ai.wander[tank] = wander
+        tanks.append(tank)
+    world.roster = tanks[:roster]
+    world.players = [tanks[k] for k in live[:players]]
+    world.enemies = [tanks[k] for k in live[players:]]
+    world.tank_hash = SpatialHash()
+    for tank in world.players + world.enemies:
+        world.tank_hash.insert(tank)
+
+    for ammo in world.ammos:
+        world.ammo_pool.release(ammo)
+    world.ammos = []
+    for _ in range(ammo_count):
+        owner, direction, x, y = ammo_format.unpack_from(data, offset)
+        offset += ammo_format.size
+        ammo = world.ammo_pool.acquire(tanks[owner], directions[direction])
+        ammo.x, ammo.y = x, y
+        world.ammos.append(ammo)
+    world.overrides = {}
+    for _ in range(override_count):
+        kind, stat, value = override_format.unpack_from(data, offset)
+        offset += override_format.size
+        world.overrides.setdefault(tank_types[kind], {})[tank_stats[stat]] = value
+
+    world.tick = tick
+    world.seed = seed
+    world.winner = winners[winner]
+    world.shots = {'players': player_shots, 'enemies': enemy_shots}
+    world.ai_ticks = ai_ticks
+    if base and world.base is None:
+        world.base = world.base_rect()
+    elif not base:
+        world.base = None
+    world.events = []
+    return changed
+
+
+def restore_terrain(world: World, cells: bytes):
+    terrain_map, grid, ai = world.terrain_map, world.grid, world.ai
+    changed = []
+    cleared = []
+    rebuild = False
+    for k, (old, new) in enumerate(zip(terrain_map.cells, cells)):
+        if old == new:
+            continue
+        i, j = divmod(k, world.columns)
+        changed.append((i, j))
+        if old >> 4 != new >> 4 or ~old & new & 15:
+            rebuild = True
+        kind = new >> 4
+        for index in range(4):
+            row, column = i * 2 + index // 2, j * 2 + index % 2
+            if kind != blank and new >> index & 1:
+                grid.fill(row, column, kind)
+            else:
+                grid.clear(row, column)
+                cleared.append((row, column))
+    terrain_map.cells[:] = cells
+    if rebuild:
+        ai.fields.clear()
+        ai.tank_fields.clear()
+    else:
+        for row, column in cleared:
+            ai.terrain_changed(row, column)
+    return changed
+
+
+def load(data: bytes):
+    columns, rows, tick, seed = header_format.unpack_from(data)[2:6]
+    offset = header_format.size + rng_format.size
+    terrain_map = TerrainMap(columns, rows, bytearray(data[offset:offset + columns * rows]), seed)
+    world = World(terrain_map, seed)
+    restore(world, data)
+    return world
+
+
+def save_file(world: World, path: str):
+    with open(path, 'wb') as f:
+        f.write(snapshot(world))
+
+
+def load_file(path: str):
+    with open(path, 'rb') as f:
+        return load(f.read())
+
+
+class History(object):
+    def __init__(self, capacity=256):
+        self.snapshots = deque(maxlen=capacity)
+
+    def push(self, world: World):
+        self.snapshots.append((world.tick, snapshot(world)))
+
+    def rewind(self, world: World, tick: int):
+        while self.snapshots and self.snapshots[-1][0] > tick:
+            self.snapshots.pop()
+        if not self.snapshots:
+            return None
+        return restore(world, self.snapshots[-1][1])
+
+    def __len__(self):
+        return len(self.snapshots)
@@ -0,0 +1,155 @@
+import argparse
+import os
+import struct
+import time
+import zlib
+
+from PySide2.QtGui import QImage, QPixmap, QTransform
+
+from src.base import Ammo, TankType, TerrainType
+from src.config import GameConfig
+from src.profiler import profiler
+
+image_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'images')
+bundle_name = 'sprites.pack'
+magic = b'QTSP'
+version = 1
+header_format = struct.Struct('<4sBH')
+entry_format = struct.Struct('<BHHHHH')
+image_format = QImage.Format_ARGB32_Premultiplied
+
+
+def sprite_keys():
+    for tank in TankType:
+        for rotation in (0, 90, 180, 270):
+            yield tank.pic, GameConfig.cube_size, GameConfig.cube_size, rotation
+    for terrain in TerrainType:
+        if terrain.pic is not None:
+            yield terrain.pic, GameConfig.cube_size // 2, GameConfig.cube_size // 2, 0
+    for rotation in (0, 90, 180, 270):
+        yield 'ammo.png', Ammo.width, Ammo.length, rotation
+    yield TankType.PLAYER_ONE.pic, 25, 25, 90
+
+
+class SpriteCache(object):
+    def __init__(self, directory=image_dir):
+        self.directory = directory
+        self.bundle = {}
+        self.images = {}
+        self.sprites = {}
+        self.tiles = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def image(self, name: str):
+        png = self.images.get(name)
+        if png is None:
+            png = QImage(os.path.join(self.directory, name)).convertToFormat(image_format)
+            self.loads += 1
+            profiler.count('pixmaps_loaded')
+            self.images[name] = png
+        return png
+
+    def render(self, name: str, width: int, height: int, rotation=0):
+        key = (name, int(width), int(height), rotation % 360)
+        image = self.bundle.get(key)
+        if image is not None:
+            return image
+        image = self.image(name).scaled(int(width), int(height))
+        if rotation % 360:
+            image = image.transformed(QTransform().rotate(rotation))
+        return image
+
+    def get(self, name: str, width: int, height=None, rotation=0):
+        if height is None:
+            height = width
+        key = (name, int(width), int(height), rotation % 360)
+        png = self.sprites.get(key)
+        if png is not None:
+            self.hits += 1
+            return png
+        self.misses += 1
+        profiler.count('pixmaps_scaled')
+        png = QPixmap.fromImage(self.render(name, width, height, rotation))
+        self.sprites[key] = png
+        return png
+
+    def tile(self, name: str, size: int):
+        key = (name, int(size))
+        image = self.tiles.get(key)
+        if image is None:
+            image = self.render(name, size, size)
+            self.tiles[key] = image
+        return image
+
+    def load_bundle(self, path=None):
+        path = path or os.path.join(self.directory, bundle_name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        name, number, count = header_format.unpack_from(data)
+        if name != magic or number != version:
+            return False
+        data = zlib.decompress(data[header_format.size:])
+        offset = 0
+        for _ in range(count):
+            length, width, height, rotation, image_width, image_height = entry_format.unpack_from(data, offset)
+            offset += entry_format.size
+            name = data[offset:offset + length].decode()
+            offset += length
+            pixels = data[offset:offset + image_width * image_height * 4]
+            offset += len(pixels)
+            image = QImage(pixels, image_width, image_height, image_width * 4, image_format).copy()
+            self.bundle[(name, width, height, rotation)] = image
+        return True
+
+    def save_bundle(self, path=None):
+        path = path or os.path.join(self.directory, bundle_name)
+        chunks = []
+        keys = list(sprite_keys())
+        for name, width, height, rotation in keys:
+            image = self.render(name, width, height, rotation).convertToFormat(image_format)
+            chunks.append(entry_format.pack(len(name), width, height, rotation, image.width(), image.height()))
+            chunks.append(name.encode())
+            chunks.append(bytes(image.constBits()))
+        with open(path, 'wb') as f:
+            f.write(header_format.pack(magic, version, len(keys)))
+            f.write(zlib.compress(b''.join(chunks), 9))
+        return path
+
+    def preload(self):
+        self.load_bundle()
+        for name, width, height, rotation in sprite_keys():
+            self.get(name, width, height, rotation)
+        for terrain in TerrainType:
+            if terrain.pic is not None:
+                self.tile(terrain.pic, GameConfig.cube_size // 2)
+
+    def stats(self):
+        return {'bundled': len(self.bundle), 'images': len(self.images), 'sprites': len(self.sprites),
+                'tiles': len(self.tiles), 'hits': self.hits, 'misses': self.misses, 'loads': self.loads}
+
+
+sprites = SpriteCache()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack the pre-scaled sprites into a single bundle.')
+    parser.add_argument('--directory', default=image_dir)
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+    cache = SpriteCache(args.directory)
+    path = cache.save_bundle(args.output)
+    start = time.perf_counter()
+    cache = SpriteCache(args.directory)
+    cache.load_bundle(path)
+    print('%s: %d sprites, %d bytes, loads in %.2f ms' % (path, len(cache.bundle), os.path.getsize(path),
+                                                         (time.perf_counter() - start) * 1000))
+    return path
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import random
+import threading
+import time
+
+from src.config import GameConfig
+from src.item import grass_terrains, ground_terrains, render_terrain
+from src.scene import camera_chunk, camera_rect
+from src.world import World
+
+chunk_size = GameConfig.chunk_size
+release_radius = GameConfig.release_radius
+
+
+class Stage(object):
+    def __init__(self, number: int, players: int, seed=None, level=None):
+        self.number = number
+        self.players = players
+        self.level = level
+        if level is not None:
+            seed = level.seed
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.enemies = GameConfig.enemies + number - 1
+        self.world = None
+        self.ground_images = {}
+        self.grass_images = {}
+        self.build_time = 0.0
+        self.wait_time = 0.0
+        self.thread = None
+
+    def prefetch(self):
+        self.thread = threading.Thread(target=self.build, daemon=True)
+        self.thread.start()
+        return self
+
+    def build(self):
+        start = time.perf_counter()
+        if self.level is not None:
+            world = self.level.world(self.players, self.enemies)
+        else:
+            world = World(seed=self.seed)
+            world.populate(self.players, self.enemies)
+        terrain_map = world.terrain_map
+        row, column = camera_chunk(camera_rect(world))
+        for ci in range(max(row - release_radius, 0), row + release_radius + 1):
+            for cj in range(max(column - release_radius, 0), column + release_radius + 1):
+                i, j = ci * chunk_size, cj * chunk_size
+                if i >= terrain_map.rows or j >= terrain_map.columns:
+                    continue
+                for images, terrains in ((self.ground_images, ground_terrains), (self.grass_images, grass_terrains)):
+                    image = render_terrain(terrain_map, terrains, i, j, chunk_size, chunk_size)
+                    if image is not None:
+                        images[(ci, cj)] = image
+        self.world = world
+        self.build_time = (time.perf_counter() - start) * 1000
+
+    def ready(self):
+        return self.thread is None or not self.thread.is_alive()
+
+    def result(self):
+        start = time.perf_counter()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        elif self.world is None:
+            self.build()
+        self.wait_time = (time.perf_counter() - start) * 1000
+        return self
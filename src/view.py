@@ -0,0 +1,38 @@
+from PySide2.QtGui import QPainter
+from PySide2.QtWidgets import QGraphicsView
+
+from src.config import GameConfig
+from src.profiler import profiler
+
+update_modes = {
+    'full': QGraphicsView.FullViewportUpdate,
+    'minimal': QGraphicsView.MinimalViewportUpdate,
+    'smart': QGraphicsView.SmartViewportUpdate,
+    'bounding': QGraphicsView.BoundingRectViewportUpdate,
+}
+
+
+class GameView(QGraphicsView):
+    on_first_frame = None
+    overlay = None
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setViewportUpdateMode(update_modes[GameConfig.viewport_update])
+        self.setCacheMode(QGraphicsView.CacheBackground if GameConfig.background_cache else QGraphicsView.CacheNone)
+        self.setOptimizationFlag(QGraphicsView.DontSavePainterState, GameConfig.optimize_view)
+        self.setOptimizationFlag(QGraphicsView.DontAdjustForAntialiasing, GameConfig.optimize_view)
+
+    def drawForeground(self, painter: QPainter, rect):
+        if self.overlay is not None and self.overlay.active():
+            painter.save()
+            painter.resetTransform()
+            self.overlay.paint(painter, self.viewport().width(), self.viewport().height())
+            painter.restore()
+
+    def paintEvent(self, event):
+        with profiler.phase('paint'):
+            super().paintEvent(event)
+        if self.on_first_frame is not None:
+            callback, self.on_first_frame = self.on_first_frame, None
+            callback()
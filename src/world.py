@@ -0,0 +1,313 @@
+import random
+from enum import Enum
+
+from src.ai import EnemyAI
+from src.base import Ammo, AmmoPool, Direction, Tank, TankType, TerrainMap, destroyable_flags, generate_map, strengths
+from src.collision import SpatialHash, TerrainGrid, approach, swept
+from src.config import GameConfig
+from src.profiler import profiler
+
+cube_size = GameConfig.cube_size
+half_size = cube_size / 2
+offsets = {
+    Direction.UP: (0, -1),
+    Direction.DOWN: (0, 1),
+    Direction.LEFT: (-1, 0),
+    Direction.RIGHT: (1, 0),
+}
+
+
+class WorldEvent(Enum):
+    AMMO_ADDED = 1
+    AMMO_REMOVED = 2
+    TERRAIN_DESTROYED = 3
+    TANK_DESTROYED = 4
+    BASE_DESTROYED = 5
+
+
+player_types = [TankType.PLAYER_ONE, TankType.PLAYER_TWO]
+enemy_types = [TankType.ENEMY_1, TankType.ENEMY_2, TankType.ENEMY_3]
+tank_stats = ('lives', 'hit_point', 'power', 'max_storage', 'speed', 'ammo_speed')
+
+
+class World(object):
+    def __init__(self, terrain_map: TerrainMap = None, seed=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        if terrain_map is None:
+            terrain_map = generate_map(GameConfig.columns, GameConfig.rows, seed)
+        self.terrain_map = terrain_map
+        self.rows = terrain_map.rows
+        self.columns = terrain_map.columns
+        self.width = self.columns * cube_size
+        self.height = self.rows * cube_size
+        self.grid = TerrainGrid(terrain_map)
+        self.tank_hash = SpatialHash()
+        self.ammo_pool = AmmoPool()
+        self.ai = EnemyAI(self)
+        self.ai_ticks = GameConfig.ai_interval // GameConfig.interval
+        self.base = self.base_rect()
+        self.overrides = {}
+        self.winner = None
+        self.shots = {'players': 0, 'enemies': 0}
+        self.focus_width = GameConfig.view_width()
+        self.focus_height = GameConfig.view_height()
+        self.tick = 0
+        self.players = []
+        self.enemies = []
+        self.roster = []
+        self.spawns = {}
+        self.ammos = []
+        self.firing = []
+        self.events = []
+
+    def base_rect(self):
+        i, j = GameConfig.base_cell(self.columns, self.rows)
+        return j * cube_size, i * cube_size, cube_size, cube_size
+
+    def tanks(self):
+        return self.players + self.enemies
+
+    def stat(self, tank_type: TankType, name: str):
+        return self.overrides.get(tank_type, {}).get(name, getattr(tank_type, name))
+
+    def make_tank(self, tank_type: TankType, direction: Direction, x: float, y: float):
+        tank = Tank(tank_type, direction)
+        for name, value in self.overrides.get(tank_type, {}).items():
+            setattr(tank, name, value)
+        tank.ammo_storage = tank.max_storage
+        tank.x = x
+        tank.y = y
+        self.spawns[tank] = (x, y)
+        return tank
+
+    def add_player(self, tank_type: TankType, x_cell: int, y_cell=None):
+        y = self.height - cube_size if y_cell is None else y_cell * cube_size
+        tank = self.make_tank(tank_type, Direction.UP, x_cell * cube_size, y)
+        self.players.append(tank)
+        self.roster.append(tank)
+        self.tank_hash.insert(tank)
+        self.ammo_pool.reserve(tank.max_storage)
+        return tank
+
+    def add_enemy(self, tank_type: TankType, x_cell: int, y_cell=0):
+        tank = self.make_tank(tank_type, Direction.DOWN, x_cell * cube_size, y_cell * cube_size)
+        self.enemies.append(tank)
+        self.tank_hash.insert(tank)
+        self.ammo_pool.reserve(tank.max_storage)
+        self.ai.field(tank)
+        return tank
+
+    def populate(self, players: int, enemies: int):
+        player_cells = GameConfig.player_cells(self.columns)
+        for k in range(players):
+            self.add_player(player_types[k], player_cells[k])
+        for k, (i, j) in enumerate(self.spawn_cells(enemies)):
+            self.add_enemy(enemy_types[k % len(enemy_types)], j, i)
+
+    def cell_free(self, i: int, j: int):
+        rect = (j * cube_size, i * cube_size, cube_size, cube_size)
+        return not self.grid.tank_blocked_in(rect) and not self.tank_hash.query(rect)
+
+    def spawn_cells(self, count: int):
+        cells = []
+        for j in GameConfig.enemy_cells(self.columns):
+            if len(cells) < count and 0 <= j < self.columns and self.cell_free(0, j):
+                cells.append((0, j))
+        for i in range(self.rows // 2):
+            for j in range(self.columns):
+                if len(cells) >= count:
+                    return cells
+                if (i, j) not in cells and self.cell_free(i, j):
+                    cells.append((i, j))
+        return cells
+
+    def pop_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def run(self, ticks: int):
+        for _ in range(ticks):
+            self.step()
+
+    def step(self):
+        for tank in self.firing:
+            self.shoot(tank)
+        self.firing = []
+        with profiler.phase('move'):
+            for tank in self.players:
+                self.move_tank(tank)
+            for tank in self.enemies:
+                self.ai.steer(tank)
+                self.move_tank(tank)
+        with profiler.phase('auto'):
+            self.ai.think(self.tick)
+        with profiler.phase('ammo'):
+            for ammo in list(self.ammos):
+                self.move_ammo(ammo)
+        self.tick += 1
+
+    def move_tank(self, tank: Tank):
+        x, y = tank.x, tank.y
+        if len(tank.directions) != 0:
+            tank.direction = tank.directions[-1]
+            dx, dy = offsets[tank.direction]
+            tank.x += dx * tank.speed
+            tank.y += dy * tank.speed
+            tank.x = min(max(tank.x, 0), self.width - cube_size)
+            tank.y = min(max(tank.y, 0), self.height - cube_size)
+        else:
+            self.align_tank(tank)
+        if self.tank_collides(tank):
+            tank.x, tank.y = x, y
+        self.tank_hash.update(tank)
+
+    def align_tank(self, tank: Tank):
+        dx, dy = offsets[tank.direction]
+        if dy != 0 and tank.y % half_size != 0:
+            tank.y += dy * tank.speed
+        if dx != 0 and tank.x % half_size != 0:
+            tank.x += dx * tank.speed
+
+    def tank_collides(self, tank: Tank):
+        if profiler.enabled:
+            profiler.count('collisions')
+        rect = tank.rect()
+        if self.grid.tank_blocked_in(rect):
+            return True
+        for other in self.tank_hash.query(rect):
+            if other is not tank:
+                return True
+        return False
+
+    def fire(self, tank: Tank):
+        if tank.lives > 0 and tank not in self.firing:
+            self.firing.append(tank)
+
+    def shoot(self, tank: Tank):
+        if tank.ammo_storage > 0:
+            tank.ammo_storage -= 1
+            self.shots['players' if tank.is_player else 'enemies'] += 1
+            ammo = self.ammo_pool.acquire(tank, tank.direction)
+            self.ammos.append(ammo)
+            self.events.append((WorldEvent.AMMO_ADDED, ammo))
+            return ammo
+
+    def impact(self, ammo: Ammo, limit=None):
+        return self.grid.raycast(ammo.rect(), ammo.direction, limit=limit)
+
+    def can_hit(self, tank: Tank, target: Tank, direction=None, ignore=frozenset()):
+        direction = direction or tank.direction
+        rect = Ammo(tank, direction).rect()
+        distance = approach(rect, direction, target.rect())
+        if distance is None:
+            return False
+        impact = self.grid.raycast(rect, direction, limit=distance + 1, ignore=ignore)
+        return impact is None or impact[0] > distance
+
+    def move_ammo(self, ammo: Ammo):
+        if profiler.enabled:
+            profiler.count('collisions')
+        speed = ammo.tank.ammo_speed
+        direction = ammo.direction
+        rect = ammo.rect()
+        impact = self.grid.raycast(rect, direction, limit=speed)
+        hit = speed if impact is None else impact[0]
+        tanks = []
+        base = False
+        distance = approach(rect, direction, self.base) if self.base is not None else None
+        if distance is not None and distance < speed and distance < hit:
+            hit, base = distance, True
+        for tank in self.tank_hash.query(swept(rect, direction, speed)):
+            distance = approach(rect, direction, tank.rect())
+            if distance is None or distance >= speed or distance < 0 and tank is ammo.tank:
+                continue
+            if distance < hit:
+                hit, tanks, base = distance, [tank], False
+            elif distance == hit:
+                tanks.append(tank)
+        dx, dy = offsets[direction]
+        ammo.x += dx * speed
+        ammo.y += dy * speed
+        if impact is not None and impact[0] <= hit:
+            power = ammo.tank.power
+            for row, column in impact[1]:
+                kind = self.grid.kinds[row * self.grid.columns + column]
+                if destroyable_flags[kind] and power >= strengths[kind]:
+                    self.destroy_terrain(row, column)
+            self.destroy_ammo(ammo)
+        elif base:
+            self.destroy_ammo(ammo)
+            self.destroy_base()
+        elif tanks:
+            shooter = ammo.tank
+            self.destroy_ammo(ammo)
+            for tank in tanks:
+                if tank.is_player != shooter.is_player and tank.lives > 0:
+                    self.damage(tank, shooter.power)
+        elif ammo.x < 0 or ammo.x > self.width or ammo.y < 0 or ammo.y > self.height:
+            self.destroy_ammo(ammo)
+
+    def damage(self, tank: Tank, power: int):
+        tank.hit_point -= power
+        if tank.hit_point > 0:
+            return
+        tank.lives -= 1
+        self.events.append((WorldEvent.TANK_DESTROYED, tank))
+        self.tank_hash.remove(tank)
+        if tank.lives > 0:
+            self.respawn(tank)
+            return
+        if tank.is_player:
+            self.players.remove(tank)
+        else:
+            self.enemies.remove(tank)
+            self.ai.forget(tank)
+        if tank in self.firing:
+            self.firing.remove(tank)
+        if not self.enemies:
+            self.finish('players')
+        elif not self.players:
+            self.finish('enemies')
+
+    def respawn(self, tank: Tank):
+        tank.hit_point = self.stat(tank.tank_type, 'hit_point')
+        tank.directions = []
+        x, y = self.spawns[tank]
+        if tank.is_player:
+            i = self.rows - 1
+            cells = [(i, int(x // cube_size))] + [(i, j) for j in GameConfig.player_cells(self.columns)]
+        else:
+            cells = [(int(y // cube_size), int(x // cube_size))] + self.spawn_cells(1)
+        for i, j in cells:
+            if self.cell_free(i, j):
+                x, y = j * cube_size, i * cube_size
+                break
+        tank.x, tank.y = x, y
+        tank.direction = Direction.UP if tank.is_player else Direction.DOWN
+        self.tank_hash.insert(tank)
+
+    def destroy_base(self):
+        if self.base is not None:
+            self.base = None
+            self.events.append((WorldEvent.BASE_DESTROYED, None))
+            self.finish('enemies')
+
+    def finish(self, winner: str):
+        if self.winner is None:
+            self.winner = winner
+
+    def destroy_terrain(self, row: int, column: int):
+        profiler.count('hits')
+        r, c, index = row // 2, column // 2, row % 2 * 2 + column % 2
+        self.terrain_map.clear(r, c, index)
+        self.grid.clear(row, column)
+        self.ai.terrain_changed(row, column)
+        self.events.append((WorldEvent.TERRAIN_DESTROYED, (r, c, index)))
+
+    def destroy_ammo(self, ammo: Ammo):
+        ammo.tank.ammo_storage += 1
+        self.ammos.remove(ammo)
+        self.ammo_pool.release(ammo)
+        self.events.append((WorldEvent.AMMO_REMOVED, ammo))
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from src.base import generate_map
+from src.config import GameConfig
+from src.levelpack import Level, LevelPack, pack, unpack, write
+from src.replay import digest
+from src.world import World
+
+
+@pytest.mark.parametrize('bits', [3, 4])
+@pytest.mark.parametrize('count', [1, 7, 8, 9, 131])
+def test_pack_round_trip(bits, count):
+    rng = random.Random(count)
+    values = bytes(rng.randrange(1 << bits) for _ in range(count))
+    assert bytes(unpack(b'xx' + pack(values, bits), 2, count, bits)) == values
+
+
+@pytest.mark.parametrize('columns, rows', [(GameConfig.columns, GameConfig.rows), (21, 17)])
+def test_level_round_trip(columns, rows):
+    assert columns * rows % 8
+    level = Level.from_map(generate_map(columns, rows, 42), [(rows - 1, 2)], [(0, 0), (1, columns - 1)])
+    data = b'pad' + level.encode()
+    decoded = Level.decode(data, 3, columns, rows)
+    assert bytes(decoded.cells) == bytes(level.cells)
+    assert decoded.seed == level.seed
+    assert decoded.player_spawns == [(rows - 1, 2)]
+    assert decoded.enemy_spawns == [(0, 0), (1, columns - 1)]
+
+
+def test_pack_file(tmp_path):
+    path = str(tmp_path / 'levels.qtl')
+    sizes = [(GameConfig.columns, GameConfig.rows), (21, 17), (40, 30)]
+    maps = [generate_map(columns, rows, seed) for seed, (columns, rows) in enumerate(sizes)]
+    write(path, (Level.from_map(terrain_map) for terrain_map in maps))
+    levels = LevelPack(path)
+    try:
+        assert len(levels) == len(maps)
+        for n, terrain_map in enumerate(maps):
+            assert levels[n].terrain_map() == terrain_map
+        assert levels[-1].terrain_map() == maps[-1]
+        assert levels[-len(maps)].terrain_map() == maps[0]
+        for n in (len(maps), -len(maps) - 1):
+            with pytest.raises(IndexError):
+                levels[n]
+    finally:
+        levels.close()
+
+
+def test_level_world_matches_populate():
+    terrain_map = generate_map(GameConfig.columns, GameConfig.rows, 5)
+    world = World(terrain_map.copy(), 5)
+    world.populate(2, 6)
+    level = Level.from_map(terrain_map)
+    assert digest(level.world(2, 6, 5)) == digest(world)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        LevelPack(str(path))
+
+
+def test_rejects_short_and_truncated_files(tmp_path):
+    path = tmp_path / 'levels.qtl'
+    write(str(path), [Level.from_map(generate_map(21, 17, seed)) for seed in range(3)])
+    data = path.read_bytes()
+    for name, content in (('empty.qtl', b''), ('header.qtl', data[:5]), ('index.qtl', data[:20])):
+        broken = tmp_path / name
+        broken.write_bytes(content)
+        with pytest.raises(ValueError):
+            LevelPack(str(broken))
+    cut = tmp_path / 'cut.qtl'
+    cut.write_bytes(data[:-1])
+    levels = LevelPack(str(cut))
+    try:
+        assert levels[0].terrain_map() == generate_map(21, 17, 0)
+        with pytest.raises(ValueError):
+            levels[2]
+    finally:
+        levels.close()
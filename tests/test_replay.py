@@ -0,0 +1,51 @@
+import pytest
+
+from src.base import generate_map
+from src.controls import AimBot, Controls
+from src.replay import Recorder, Replay, apply, digest
+from src.world import World
+
+
+def play_recorded(path, seed: int, ticks: int):
+    world = World(generate_map(13, 10, seed), seed)
+    world.populate(2, 4)
+    controls = Controls([AimBot(seed), AimBot(seed + 1)])
+    recorder = Recorder(path, world, flush_size=64)
+    while world.winner is None and world.tick < ticks:
+        apply(world, controls.sample(world))
+        recorder.record(world)
+        world.step()
+        world.pop_events()
+    recorder.close()
+    return world
+
+
+def test_replay_matches_recorded_match(tmp_path):
+    path = str(tmp_path / 'match.qtr')
+    world = play_recorded(path, 7, 3000)
+    replay = Replay.load(path)
+    assert replay.ticks() == world.tick
+    played = replay.play()
+    assert played.tick == world.tick
+    assert played.winner == world.winner
+    assert digest(played) == digest(world)
+
+
+def test_replay_of_unfinished_match(tmp_path):
+    path = str(tmp_path / 'short.qtr')
+    world = play_recorded(path, 11, 100)
+    played = Replay.load(path).play()
+    assert played.winner is None
+    assert digest(played) == digest(world)
+
+
+def test_rejects_empty_and_truncated_files(tmp_path):
+    path = str(tmp_path / 'match.qtr')
+    play_recorded(path, 7, 300)
+    with open(path, 'rb') as f:
+        data = f.read()
+    for name, content in (('empty.qtr', b''), ('short.qtr', data[:10]), ('cut.qtr', data[:-1])):
+        broken = tmp_path / name
+        broken.write_bytes(content)
+        with pytest.raises(ValueError):
+            Replay.load(str(broken))
@@ -0,0 +1,78 @@
+import random
+
+from src.base import TankType, generate_map
+from src.replay import apply, command, digest, directions
+from src.snapshot import History, load, restore, snapshot
+from src.world import World
+
+
+def command_stream(seed: int, ticks: int):
+    rng = random.Random(seed)
+    return [bytes(command(rng.choice(directions + [None]), rng.random() < 0.1) for _ in range(2))
+            for _ in range(ticks)]
+
+
+def new_world(seed: int, overrides=None):
+    world = World(generate_map(13, 10, seed), seed)
+    world.overrides = overrides or {}
+    world.populate(2, 4)
+    return world
+
+
+def run(world: World, commands):
+    for tick_commands in commands:
+        apply(world, tick_commands)
+        world.step()
+        world.pop_events()
+
+
+def test_loaded_snapshot_continues_identically():
+    commands = command_stream(3, 600)
+    world = new_world(3)
+    run(world, commands[:300])
+    copy = load(snapshot(world))
+    assert digest(copy) == digest(world)
+    for tick_commands in commands[300:]:
+        run(world, [tick_commands])
+        run(copy, [tick_commands])
+        assert digest(copy) == digest(world)
+    assert copy.tick == world.tick
+    assert copy.winner == world.winner
+
+
+def test_restore_rewinds_in_place():
+    commands = command_stream(5, 400)
+    world = new_world(5)
+    run(world, commands[:150])
+    data = snapshot(world)
+    run(world, commands[150:])
+    expected = digest(world)
+    restore(world, data)
+    assert world.tick == 150
+    run(world, commands[150:])
+    assert digest(world) == expected
+
+
+def test_history_rewind():
+    commands = command_stream(9, 200)
+    world = new_world(9)
+    history = History()
+    states = {}
+    for tick_commands in commands:
+        history.push(world)
+        states[world.tick] = digest(world)
+        run(world, [tick_commands])
+    history.rewind(world, 120)
+    assert world.tick == 120
+    assert digest(world) == states[120]
+
+
+def test_snapshot_keeps_wide_stats_and_overrides():
+    overrides = {TankType.PLAYER_ONE: {'lives': 400, 'hit_point': 1000}, TankType.ENEMY_3: {'power': 300}}
+    world = new_world(4, overrides)
+    run(world, command_stream(4, 50))
+    copy = load(snapshot(world))
+    assert copy.overrides == overrides
+    assert copy.players[0].lives == world.players[0].lives == 400
+    assert copy.stat(TankType.PLAYER_ONE, 'hit_point') == 1000
+    assert digest(copy) == digest(world)